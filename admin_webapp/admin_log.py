@@ -1,13 +1,40 @@
+"""Audit log of admin actions, the tapir_admin_audit table.
+
+The rows of a request are collected and written with one multi-row INSERT
+just before the DB session commits, in the same transaction as the changes
+they are about. Either both are written or neither is, and a rollback drops
+the rows collected since the last commit.
+
+With ``AUDIT_BUFFER_ROWS`` set, the rows of committed changes are instead
+collected across requests and written by an :class:`AuditBuffer` once it has
+that many rows, or at the first commit after ``AUDIT_BUFFER_SECONDS``, and at
+exit. This is not crash safe: rows still in the buffer are lost if the process
+is killed, and uwsgi may stop a worker without running ``atexit``. Rows that
+fail to be written are kept for the next write, up to
+``AUDIT_BUFFER_MAX_KEPT`` rows.
+"""
+
+import atexit
 from datetime import datetime
-from typing import Literal, Union
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Any, Iterable, List, Literal, Optional, Tuple, Union
+
+from admin_webapp.extensions import get_db, is_app_session
+from admin_webapp import timing
 
-from admin_webapp.extensions import get_db
+from flask import Flask, current_app, g, has_app_context, request
 
-from flask import current_app, request
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
 
+from arxiv.base import logging
 
 from arxiv_db.models import TapirAdminAudit
 
+logger = logging.getLogger(__name__)
+
 
 Actions = Literal['new-user',
                   'change-password',
@@ -15,21 +42,163 @@ Actions = Literal['new-user',
                   'add-paper-owner-2',  #data = document_id
                   ]
 
+def _audit_row(affected_user:int, action:Actions, data="", comment="") -> dict:
+    """Values for a tapir_admin_audit row about the current request."""
+    return dict(log_date=int(datetime.now().astimezone(current_app.config['ARXIV_BUSINESS_TZ']).timestamp()),
+                ip_addr = request.remote_addr,
+                affected_user=affected_user,
+                tracking_cookie=request.cookies.get(current_app.config['CLASSIC_COOKIE_NAME'], ''),
+                action=action,
+                data=data,
+                comment=comment,
+                session_id=request.auth.session_id,
+                admin_user=request.auth.user.user_id,
+                )
+
+def _pending() -> List[dict]:
+    """The audit rows of the current request that are not written yet."""
+    if 'audit_rows' not in g:
+        g.audit_rows = []
+    return g.audit_rows  # type: ignore
+
 def audit_admin(affected_user:int, action:Actions, data="", comment=""):
     """Creates a tapir_admin_audit row.
 
-    Does not call commit.
+    Does not call commit, the row is written when the session commits.
+    """
+    _pending().append(_audit_row(affected_user, action, data, comment))
+
+def audit_admin_many(entries:Iterable[Tuple[int, str]], action:Actions, comment=""):
+    """Creates a tapir_admin_audit row for each (affected_user, data) in `entries`.
+
+    Does not call commit, the rows are written when the session commits.
+    """
+    _pending().extend(_audit_row(affected_user, action, data, comment)
+                      for affected_user, data in entries)
+
+
+def _write(connection: Union[Session, Engine], rows: List[dict]) -> None:
+    # One executemany INSERT, which the MySQL driver sends as one multi-row INSERT
+    if isinstance(connection, Session):
+        connection.execute(insert(TapirAdminAudit), rows)
+    else:
+        with connection.begin() as conn:
+            conn.execute(insert(TapirAdminAudit), rows)
+
+
+class AuditBuffer:
+    """Audit rows of committed changes, written in batches across requests."""
+
+    def __init__(self, app: Flask, engine: Engine, max_rows: int,
+                 max_seconds: float, max_kept: int) -> None:
+        self.app = app
+        self.engine = engine
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.max_kept = max_kept
+        self._rows: List[dict] = []
+        self._since = monotonic()
+        self._lock = Lock()
+
+    def add(self, rows: List[dict]) -> None:
+        """Add rows, and write the buffer if it is full or old enough."""
+        with self._lock:
+            if not self._rows:
+                self._since = monotonic()
+            self._rows.extend(rows)
+            if len(self._rows) < self.max_rows \
+                    and monotonic() - self._since < self.max_seconds:
+                return
+            rows, self._rows = self._rows, []
+        self._flush(rows)
+
+    def flush(self) -> None:
+        """Write all the rows in the buffer."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            self._flush(rows)
+
+    def _flush(self, rows: List[dict]) -> None:
+        start = perf_counter()
+        failed = True
+        try:
+            _write(self.engine, rows)
+            failed = False
+        except Exception as e:  # pylint: disable=broad-except
+            self._keep(rows, e)
+        finally:
+            if self.app.config['TIMING_METRICS']:
+                timing.METRICS.observe('audit_flush', perf_counter() - start, failed)
+
+    def _keep(self, rows: List[dict], error: Exception) -> None:
+        """Put rows that could not be written back, up to ``max_kept`` rows.
+
+        They are written with the next batch. Rows over the limit are dropped
+        and logged, without the IP addresses and tracking cookies.
+        """
+        with self._lock:
+            if not self._rows:
+                self._since = monotonic()
+            kept = rows + self._rows
+            self._rows, dropped = kept[:self.max_kept], kept[self.max_kept:]
+        # Not the SQLAlchemy error, its message has the rows' values
+        logger.error('Could not write %d audit rows, keeping them for the next'
+                     ' write: %r', len(rows), getattr(error, 'orig', error))
+        if dropped:
+            logger.error('Dropped %d audit rows over the limit of %d: %s',
+                         len(dropped), self.max_kept,
+                         [_redacted(row) for row in dropped])
+
+
+def _redacted(row: dict) -> dict:
+    """An audit row to log, without the client's IP and tracking cookie."""
+    return {column: value for column, value in row.items()
+            if column not in ('ip_addr', 'tracking_cookie')}
+
+
+def _before_commit(session: Session) -> None:
+    if not has_app_context() or not is_app_session(current_app, session):
+        return
+    rows = g.pop('audit_rows', None)
+    if not rows:
+        return
+    buffer: Optional[AuditBuffer] = current_app.extensions.get('audit_buffer')
+    if buffer is not None:
+        session.info['audit_rows'] = rows  # Buffered once committed
+        return
+    with timing.span('audit_flush'):
+        _write(session, rows)
+
+
+def _after_commit(session: Session) -> None:
+    rows = session.info.pop('audit_rows', None)
+    if rows:
+        current_app.extensions['audit_buffer'].add(rows)
+
+
+def _after_soft_rollback(session: Session, previous_transaction: Any) -> None:
+    # The changes the rows are about are rolled back
+    session.info.pop('audit_rows', None)
+    if has_app_context() and is_app_session(current_app, session):
+        g.pop('audit_rows', None)
+
+
+def init_app(app: Flask) -> None:
+    """Write the audit rows of a request when its DB session commits.
+
+    The listeners are on the class of the app's session, they ignore the
+    events of other sessions, see :func:`.is_app_session`.
     """
-    session = get_db(current_app)
-
-    item=TapirAdminAudit(log_date=int(datetime.now().astimezone(current_app.config['ARXIV_BUSINESS_TZ']).timestamp()),
-                         ip_addr = request.remote_addr,
-                         affected_user=affected_user,
-                         tracking_cookie=request.cookies.get(current_app.config['CLASSIC_COOKIE_NAME'], ''),
-                         action=action,
-                         data=data,
-                         comment=comment,
-                         session_id=request.auth.session_id,
-                         admin_user=request.auth.user.user_id,
-                    )
-    session.add(item)
+    db_session = get_db(app).session
+    event.listen(db_session, 'before_commit', _before_commit)
+    event.listen(db_session, 'after_commit', _after_commit)
+    event.listen(db_session, 'after_soft_rollback', _after_soft_rollback)
+    if app.config['AUDIT_BUFFER_ROWS'] > 0:
+        with app.app_context():
+            engine = get_db(app).engine
+        buffer = AuditBuffer(app, engine, app.config['AUDIT_BUFFER_ROWS'],
+                             app.config['AUDIT_BUFFER_SECONDS'],
+                             app.config['AUDIT_BUFFER_MAX_KEPT'])
+        app.extensions['audit_buffer'] = buffer
+        atexit.register(buffer.flush)
@@ -70,13 +70,199 @@ ARXIV_BUSINESS_TZ = ZoneInfo(os.environ.get('ARXIV_BUSINESS_TZ', 'America/New_Yo
 
 SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
 CLASSIC_DATABASE_URI = SQLALCHEMY_DATABASE_URI
+"""Only tells arxiv_auth.legacy that the legacy DB is configured. It uses the
+same engine as the app, see extensions.SharedSQLAlchemy."""
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+"""Connections kept open per uwsgi worker.
+
+A worker runs 4 threads (see uwsgi.ini), plus one when LOGIN_SESSION_THREADS
+is set."""
+
+DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', '5'))
+"""Connections opened beyond DB_POOL_SIZE when busy, closed when returned."""
+
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+"""Seconds to wait for a connection from a full pool."""
+
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+"""Seconds after which a connection is replaced, before MySQL or a proxy
+drops it as idle."""
+
+DB_POOL_PRE_PING = bool(int(os.environ.get('DB_POOL_PRE_PING', '1')))
+"""Test connections as they are taken from the pool and replace stale
+ones."""
+
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_POOL_MAX_OVERFLOW,
+    'pool_timeout': DB_POOL_TIMEOUT,
+    'pool_recycle': DB_POOL_RECYCLE,
+    'pool_pre_ping': DB_POOL_PRE_PING,
+}
+
+SQLALCHEMY_REPLICA_DATABASE_URI = os.environ.get('SQLALCHEMY_REPLICA_DATABASE_URI')
+"""Optional read replica for the admin listing and detail views, see
+replica.py."""
+
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+"""Read from the primary while the replica is more seconds behind than this."""
+
+DB_REPLICA_CHECK_TTL = float(os.environ.get('DB_REPLICA_CHECK_TTL', '10'))
+"""Seconds between checks of the replica lag."""
+
+SQL_QUERY_STATS = bool(int(os.environ.get('SQL_QUERY_STATS', '0')))
+"""Count and time the SQL statements of each request, see query_stats.py."""
+
+SQL_SLOW_QUERY_SECONDS = float(os.environ.get('SQL_SLOW_QUERY_SECONDS', '1'))
+"""Log statements that take at least this long."""
+
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', '10'))
+"""Log a statement run more than this many times in a request as a possible
+N+1."""
+
+SQL_QUERY_BUDGET_RAISE = bool(int(os.environ.get('SQL_QUERY_BUDGET_RAISE', '0')))
+"""Fail requests to views that run more statements than their query budget,
+for tests. Otherwise this is only logged."""
+
+OWNERSHIP_KEYSET_PAGINATION = bool(int(os.environ.get('OWNERSHIP_KEYSET_PAGINATION', '0')))
+"""Page the ownership request listings with cursors instead of page numbers.
+
+Keyset pagination seeks on the request ID so deep pages cost the same as the
+first. A listing can also be switched to it per request with a ``cursor``
+query parameter, an empty ``cursor`` is the first page."""
+
+OWNERSHIP_COUNT_CACHE_TTL = int(os.environ.get('OWNERSHIP_COUNT_CACHE_TTL', '60'))
+"""Seconds to cache the total count on ownership request listings.
+
+The cache is dropped when an ownership request is edited. 0 disables it."""
+
+OWNERSHIP_COUNT_LIMIT = int(os.environ.get('OWNERSHIP_COUNT_LIMIT', '0'))
+"""Stop counting ownership requests at this many rows.
+
+Listings with more rows show the count as "N+". 0 counts every row."""
+
+REGISTRATION_TAKEN_CACHE_TTL = int(os.environ.get('REGISTRATION_TAKEN_CACHE_TTL', '300'))
+"""Seconds a username or email seen to be taken is answered as taken without
+a query. 0 disables the cache."""
+
+REGISTRATION_TAKEN_CACHE_SIZE = int(os.environ.get('REGISTRATION_TAKEN_CACHE_SIZE', '10000'))
+"""Most taken usernames and emails to cache per process."""
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+"""Seconds to cache the data of the admin user page.
+
+The data of a user is dropped when a change about them is committed. 0
+disables the cache."""
+
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1000'))
+"""Most users to cache the admin user page data of, per process."""
+
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+"""Proxies in front of the app that append to ``X-Forwarded-For``.
+
+The client address is taken that many entries from the end of the header. The
+GCP HTTP(S) load balancer appends the client and its own address, so it
+counts as 2. Leave at 0 if the app is reached directly, otherwise clients can
+set their address with the header."""
+
+RATE_LIMIT = bool(int(os.environ.get('RATE_LIMIT', '0')))
+"""Limit the requests per client IP to login, registration and captchas.
+
+Behind a load balancer set ``TRUSTED_PROXY_HOPS`` first, or all clients share
+the limits of the load balancer address."""
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'local')
+"""Where to keep the rate limit buckets.
+
+``local`` keeps them in each worker process, ``redis`` shares them between
+all workers through the Redis of the ``REDIS_*`` config."""
+
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.environ.get('RATE_LIMIT_LOCAL_MAX_KEYS', '100000'))
+"""Most client IPs to keep rate limit buckets for with the local backend."""
+
+RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/60')
+"""Login POSTs per client IP, as "N/S": a burst of N, refilled at N per S
+seconds."""
+
+RATE_LIMIT_REGISTER = os.environ.get('RATE_LIMIT_REGISTER', '5/60')
+"""Registration POSTs per client IP, see ``RATE_LIMIT_LOGIN``."""
+
+RATE_LIMIT_REGISTER_AVAILABLE = os.environ.get('RATE_LIMIT_REGISTER_AVAILABLE', '60/60')
+"""Live username and email availability checks per client IP, see
+``RATE_LIMIT_LOGIN``."""
+
+RATE_LIMIT_CAPTCHA = os.environ.get('RATE_LIMIT_CAPTCHA', '20/60')
+"""Captcha images per client IP, see ``RATE_LIMIT_LOGIN``."""
+
+LOGIN_SESSION_THREADS = int(os.environ.get('LOGIN_SESSION_THREADS', '0'))
+"""Threads to create legacy sessions on at login, while the session is created
+in the request thread. If 0 the two are created one after the other."""
+
+SERVER_TIMING = bool(int(os.environ.get('SERVER_TIMING', '0')))
+"""Send the time of each phase of a request, like password checking at login,
+in a ``Server-Timing`` header. Off by default since it tells clients more about
+the time taken to check a password."""
+
+TIMING_METRICS = bool(int(os.environ.get('TIMING_METRICS', '0')))
+"""Keep histograms of the time of each phase, served at /metrics."""
+
+LOGOUT_OUTBOX_PATH = os.environ.get('LOGOUT_OUTBOX_PATH', '')
+"""SQLite file of legacy sessions to invalidate after logout.
+
+If set, logout enqueues the legacy session there and redirects at once, and a
+thread in each worker invalidates it in the legacy DB, with retries. The file
+must be on local disk, and can be shared by the workers of a node. If empty
+the legacy session is invalidated before the redirect."""
+
+LOGOUT_OUTBOX_RETRY_DELAY = float(os.environ.get('LOGOUT_OUTBOX_RETRY_DELAY', '1'))
+"""Seconds before a failed legacy logout is retried, doubled on each retry."""
+
+LOGOUT_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('LOGOUT_OUTBOX_MAX_ATTEMPTS', '10'))
+"""Times to try a legacy logout before it is dropped and logged."""
+
+AUDIT_BUFFER_ROWS = int(os.environ.get('AUDIT_BUFFER_ROWS', '0'))
+"""Buffer admin audit rows across requests and write them this many at a time.
+
+If 0, the default, the rows of a request are written in the transaction of the
+changes they are about.
+
+Buffering is NOT crash safe. Buffered rows are written after the changes are
+committed. They are lost if the worker is killed before they are written, or
+is stopped without running ``atexit``, as uwsgi may do. Only use it where
+losing some audit rows is acceptable."""
+
+AUDIT_BUFFER_SECONDS = float(os.environ.get('AUDIT_BUFFER_SECONDS', '5'))
+"""Write the buffered admin audit rows at the first commit after they have
+been buffered this long, see ``AUDIT_BUFFER_ROWS``."""
+
+AUDIT_BUFFER_MAX_KEPT = int(os.environ.get('AUDIT_BUFFER_MAX_KEPT', '1000'))
+"""Most buffered admin audit rows to keep after failed writes, to write with
+the next batch. Rows over this are dropped and logged without their IP
+addresses and tracking cookies, see ``AUDIT_BUFFER_ROWS``."""
+
 CAPTCHA_SECRET = os.environ.get('CAPTCHA_SECRET', 'foocaptcha')
 """Used to encrypt captcha answers, so that we don't need to store them."""
 
 CAPTCHA_FONT = os.environ.get('CAPTCHA_FONT', None)
 
+CAPTCHA_RENDER_WORKERS = int(os.environ.get('CAPTCHA_RENDER_WORKERS', '0'))
+"""Number of processes to render captcha images in.
+
+0 renders in the request thread. The processes are started by wsgi.py, before
+the uwsgi worker starts its request threads."""
+
+CAPTCHA_RENDER_MAX_PENDING = int(os.environ.get('CAPTCHA_RENDER_MAX_PENDING', '16'))
+"""Most captcha images queued in the render processes before rendering in the
+request thread instead."""
+
+CAPTCHA_RENDER_TIMEOUT = float(os.environ.get('CAPTCHA_RENDER_TIMEOUT', '2'))
+"""Seconds to wait on the render processes.
+
+An image they haven't started on by then is rendered in the request thread
+instead. If they are still rendering it, the request gets a 503."""
+
 URLS = [
     ("lost_password", "/user/lost_password", BASE_SERVER),
     ("account", "/user", BASE_SERVER)
@@ -84,6 +270,14 @@ URLS = [
 
 CREATE_DB = bool(int(os.environ.get('CREATE_DB', 0)))
 
+HEALTH_CHECK_CACHE_TTL = float(os.environ.get('HEALTH_CHECK_CACHE_TTL', '10'))
+"""Seconds to reuse the DB and Redis results of /health/ready."""
+
+WARM_UP = bool(int(os.environ.get('WARM_UP', '0')))
+"""Compile templates and open DB and Redis connections when the app is
+created, see admin_webapp/startup.py. With this set wsgi.py also creates the
+app when it is loaded rather than on the first request."""
+
 
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', 'nope')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', 'nope')
@@ -11,11 +11,14 @@ authorization information.
 """
 
 from typing import Dict, Tuple, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
 import re
+import sqlite3
 
 from werkzeug.datastructures import MultiDict
 from werkzeug.exceptions import InternalServerError
-from flask import Markup
+from flask import Markup, current_app, g
 
 from wtforms import StringField, PasswordField, Form
 from wtforms.validators import DataRequired
@@ -29,11 +32,13 @@ from arxiv_auth.domain import User, Authorizations, Session
 
 from arxiv_auth.auth.sessions import SessionStore
 
-from arxiv_auth.legacy import exceptions, sessions as legacy_sessions
+from arxiv_auth.legacy import exceptions, sessions as legacy_sessions, \
+    cookies as legacy_cookies
 from arxiv_auth.legacy.authenticate import authenticate
 from arxiv_auth.legacy.util import transaction
 
-from admin_webapp import config
+from admin_webapp import config, timing
+from admin_webapp.outbox import Outbox
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +85,9 @@ def login(method: str, form_data: MultiDict, ip: str,
     logger.debug('Login form submitted')
     form = LoginForm(form_data)
     data: Dict[str, Any] = {'form': form, 'next_page': next_page}
-    if not form.validate():
+    with timing.span('form'):
+        valid = form.validate()
+    if not valid:
         logger.debug('Form data is not valid')
         return data, status.HTTP_400_BAD_REQUEST, {}
 
@@ -109,19 +116,9 @@ def login(method: str, form_data: MultiDict, ip: str,
         })
         return data, status.HTTP_400_BAD_REQUEST, {}
 
-    try:    # Create a session in the distributed session store.
-        session = sessions.create(auths, ip, ip, track, user=user)
-        cookie = sessions.generate_cookie(session)
-        logger.debug('Created session: %s', session.session_id)
-    except sessions.exceptions.SessionCreationFailed as e:
-        logger.debug('Could not create session: %s', e)
-        raise InternalServerError('Cannot log in') from e  # type: ignore
-
-    try:    # Create a session in the legacy session store.
-        c_session, c_cookie = _do_login(auths, ip, track, user)
-    except exceptions.SessionCreationFailed as e:
-        logger.debug('Could not create legacy session: %s', e)
-        raise InternalServerError('Cannot log in') from e  # type: ignore
+    threads = current_app.config['LOGIN_SESSION_THREADS']
+    create = _create_sessions_parallel if threads else _create_sessions
+    session, cookie, c_session, c_cookie = create(sessions, auths, ip, track, user)
 
     # The UI route should use these to set cookies on the response.
     data.update({
@@ -168,13 +165,11 @@ def logout(session_cookie: Optional[str],
             logger.debug('Logout failed: %s', e)
 
     if classic_session_cookie:
-        try:
-            with transaction():
-                _do_logout(classic_session_cookie)
-        except exceptions.SessionDeletionFailed as e:
-            logger.debug('Logout failed: %s', e)
-        except exceptions.UnknownSession as e:
-            logger.debug('Unknown session: %s', e)
+        outbox = current_app.extensions.get('logout_outbox')
+        if outbox is not None:
+            _enqueue_logout(outbox, classic_session_cookie)
+        else:
+            _logout_legacy(classic_session_cookie)
 
     data = {
         'cookies': {
@@ -185,6 +180,102 @@ def logout(session_cookie: Optional[str],
     return data, status.HTTP_303_SEE_OTHER, {'Location': next_page}
 
 
+def _create_session(sessions: SessionStore, auths: Authorizations, ip: str,
+                    track: str, user: User) -> Tuple[Session, str]:
+    """Create a session in the distributed session store."""
+    with timing.span('session'):
+        session = sessions.create(auths, ip, ip, track, user=user)
+    with timing.span('cookie'):
+        cookie = sessions.generate_cookie(session)
+    logger.debug('Created session: %s', session.session_id)
+    return session, cookie
+
+
+def _create_sessions(sessions: SessionStore, auths: Authorizations, ip: str,
+                     track: str, user: User) -> Tuple[Session, str, Session, str]:
+    """Create the session and then the legacy session."""
+    try:
+        session, cookie = _create_session(sessions, auths, ip, track, user)
+    except sessions.exceptions.SessionCreationFailed as e:
+        logger.debug('Could not create session: %s', e)
+        raise InternalServerError('Cannot log in') from e  # type: ignore
+
+    try:    # Create a session in the legacy session store.
+        c_session, c_cookie = _do_login(auths, ip, track, user)
+    except exceptions.SessionCreationFailed as e:
+        logger.debug('Could not create legacy session: %s', e)
+        raise InternalServerError('Cannot log in') from e  # type: ignore
+    return session, cookie, c_session, c_cookie
+
+
+_session_pool: Optional[ThreadPoolExecutor] = None
+_session_pool_lock = Lock()
+
+
+def _get_session_pool() -> ThreadPoolExecutor:
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = ThreadPoolExecutor(
+                max_workers=current_app.config['LOGIN_SESSION_THREADS'],
+                thread_name_prefix='legacy-session')
+        return _session_pool
+
+
+def _create_sessions_parallel(sessions: SessionStore, auths: Authorizations,
+                              ip: str, track: str, user: User) \
+                              -> Tuple[Session, str, Session, str]:
+    """Create the session and the legacy session at the same time.
+
+    The legacy session is created on a thread of a pool with its own app
+    context, and so its own DB session. If either fails, the one that was
+    created is deleted so no half logged in user is left behind.
+    """
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    timings = timing.current()
+
+    def legacy_login() -> Tuple[Session, str]:
+        with app.app_context():
+            g.timings = timings  # Spans go to the request's timings
+            return _do_login(auths, ip, track, user)
+
+    legacy_future = _get_session_pool().submit(legacy_login)
+    try:
+        session, cookie = _create_session(sessions, auths, ip, track, user)
+    except Exception as e:
+        _discard_legacy_session(legacy_future)
+        if isinstance(e, sessions.exceptions.SessionCreationFailed):
+            logger.debug('Could not create session: %s', e)
+            raise InternalServerError('Cannot log in') from e  # type: ignore
+        raise
+
+    try:
+        c_session, c_cookie = legacy_future.result()
+    except Exception as e:
+        _discard_session(sessions, cookie)
+        if isinstance(e, exceptions.SessionCreationFailed):
+            logger.debug('Could not create legacy session: %s', e)
+            raise InternalServerError('Cannot log in') from e  # type: ignore
+        raise
+    return session, cookie, c_session, c_cookie
+
+
+def _discard_legacy_session(legacy_future: 'Future[Tuple[Session, str]]') -> None:
+    try:
+        _, c_cookie = legacy_future.result()
+        with transaction():
+            _do_logout(c_cookie)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.debug('No legacy session to discard: %s', e)
+
+
+def _discard_session(sessions: SessionStore, cookie: str) -> None:
+    try:
+        sessions.delete(cookie)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning('Could not discard session: %s', e)
+
+
 class LoginForm(Form):
     """Log in form."""
 
@@ -195,7 +286,7 @@ class LoginForm(Form):
 # These are broken out to add retry and transaction logic.
 @retry(exceptions.Unavailable, tries=3, delay=0.5, backoff=2)
 def _do_authn(username: str, password: str) -> Tuple[User, Authorizations]:
-    with transaction():
+    with timing.span('authn'), transaction():
         return authenticate(username_or_email=username,
                             password=password)
 
@@ -203,7 +294,7 @@ def _do_authn(username: str, password: str) -> Tuple[User, Authorizations]:
 @retry(exceptions.Unavailable, tries=3, delay=0.5, backoff=2)
 def _do_login(auths: Authorizations, ip: str, tracking_cookie: str,
               user: User = None) -> Tuple[Session, str]:
-    with transaction():
+    with timing.span('legacy_session'), transaction():
         c_session = legacy_sessions.create(auths, ip, ip, tracking_cookie, user=user)
         c_cookie = legacy_sessions.generate_cookie(c_session)
         logger.debug('Created classic session: %s', c_session.session_id)
@@ -216,6 +307,42 @@ def _do_logout(classic_session_cookie: str) -> None:
         legacy_sessions.invalidate(classic_session_cookie)
 
 
+def _logout_legacy(classic_session_cookie: str) -> None:
+    try:
+        with transaction():
+            _do_logout(classic_session_cookie)
+    except exceptions.SessionDeletionFailed as e:
+        logger.debug('Logout failed: %s', e)
+    except exceptions.UnknownSession as e:
+        logger.debug('Unknown session: %s', e)
+
+
+def _enqueue_logout(outbox: Outbox, classic_session_cookie: str) -> None:
+    try:
+        session_id = legacy_cookies.unpack(classic_session_cookie)[0]
+    except exceptions.InvalidCookie as e:
+        logger.debug('Unknown session: %s', e)
+        return
+    try:
+        outbox.put(session_id)
+    except sqlite3.Error as e:
+        logger.warning('Could not enqueue legacy logout: %s', e)
+        _logout_legacy(classic_session_cookie)
+
+
+def invalidate_legacy_session(session_id: str) -> None:
+    """Invalidate a legacy session, for the logout :class:`.Outbox`.
+
+    It is tried once, the outbox retries it if it fails. A session that is
+    already gone is done with.
+    """
+    try:
+        with transaction():
+            legacy_sessions.invalidate_by_id(session_id)
+    except exceptions.UnknownSession as e:
+        logger.debug('Unknown session: %s', e)
+
+
 def good_next_page(next_page: str) -> bool:
     """True if next_page is a valid query parameter for use with the login page."""
     return next_page == config.DEFAULT_LOGIN_REDIRECT_URL \
@@ -1,7 +1,7 @@
 """Provides the captcha image controller."""
 
 from typing import Tuple, Optional
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
 from arxiv import status
 
 from .. import stateless_captcha
@@ -18,4 +18,7 @@ def get(token: str, secret: str, ip_address: str,
         image = stateless_captcha.render(token, secret, ip_address, font=font)
     except stateless_captcha.InvalidCaptchaToken as e:
         raise BadRequest('Invalid or expired token') from e  # type: ignore
+    except stateless_captcha.RenderTimeout as e:
+        raise ServiceUnavailable('Captcha image is busy, try again',
+                                 retry_after=1) from e  # type: ignore
     return {'image': image, 'mimetype': 'image/png'}, status.HTTP_200_OK, {}
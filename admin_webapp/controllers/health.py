@@ -0,0 +1,85 @@
+"""Provides the readiness check controller.
+
+The checks of the DB and Redis are run at most once every
+``HEALTH_CHECK_CACHE_TTL`` seconds per process, other requests in between get
+the last result. This keeps frequent probes from load balancers cheap.
+"""
+
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import text
+
+from arxiv import status
+from arxiv.base import logging
+
+from arxiv_auth.auth.sessions import SessionStore
+
+from ..extensions import get_db
+
+logger = logging.getLogger(__name__)
+
+ResponseData = Tuple[dict, int, dict]
+
+_lock = Lock()
+_last: Optional[Tuple[float, Dict[str, dict]]] = None
+
+
+def check_db() -> None:
+    """Run a trivial query on the DB."""
+    get_db(current_app).session.execute(text('SELECT 1'))
+
+
+def check_redis() -> None:
+    """Ping the Redis used for sessions."""
+    SessionStore.current_session().r.ping()
+
+
+CHECKS: Dict[str, Callable[[], None]] = {'db': check_db, 'redis': check_redis}
+
+
+def _run_checks() -> Dict[str, dict]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, check in CHECKS.items():
+        start = perf_counter()
+        try:
+            check()
+            error: Optional[str] = None
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning('Readiness check %s failed: %s', name, exc)
+            error = type(exc).__name__  # Not the message, this is public
+        results[name] = {'ok': error is None,
+                         'latency_ms': round((perf_counter() - start) * 1000, 2)}
+        if error:
+            results[name]['error'] = error
+    return results
+
+
+def readiness() -> ResponseData:
+    """Check that the DB and Redis can be used.
+
+    Returns
+    -------
+    dict
+        ``status`` is ``ok`` or ``degraded``, ``checks`` has the result and
+        latency of each check and ``age`` the seconds since they were run.
+    int
+        200 if all checks passed, 503 otherwise.
+    dict
+        Headers.
+    """
+    global _last
+    ttl = current_app.config['HEALTH_CHECK_CACHE_TTL']
+    with _lock:
+        if _last is None or monotonic() - _last[0] >= ttl:
+            _last = (monotonic(), _run_checks())
+        checked_at, checks = _last
+
+    ok = all(check['ok'] for check in checks.values())
+    data = {'status': 'ok' if ok else 'degraded',
+            'checks': checks,
+            'age': round(monotonic() - checked_at, 1)}
+    code = status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE
+    return data, code, {'Cache-Control': 'no-store'}
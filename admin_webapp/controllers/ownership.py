@@ -1,6 +1,10 @@
 """arXiv paper ownership controllers."""
 
+import csv
+import io
+import json
 from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import logging
 from admin_webapp.routes import endorsement
 
@@ -10,16 +14,22 @@ from flask import Blueprint, render_template, request, \
 from flask_sqlalchemy import Pagination
 
 from sqlalchemy import select, func, text, insert, update
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.sql import Select
 from arxiv.base import logging
 
 from arxiv_auth.auth.decorators import scoped
 
-from arxiv_db.models import OwnershipRequests, OwnershipRequestsAudit, TapirUsers, Documents, EndorsementRequests
-from arxiv_db.models.associative_tables import t_arXiv_paper_owners
+from arxiv_db.models import OwnershipRequests, OwnershipRequestsAudit, TapirUsers, Documents, EndorsementRequests, \
+    TapirNicknames
+from arxiv_db.models.associative_tables import t_arXiv_paper_owners, \
+    t_arXiv_ownership_requests_papers
 
-from admin_webapp.extensions import get_csrf, get_db
-from admin_webapp.admin_log import audit_admin
+from admin_webapp.extensions import get_csrf, get_db, get_count_cache, get_user_cache
+from admin_webapp.admin_log import audit_admin, audit_admin_many
+from admin_webapp.replica import read_session
+
+from .pagination import paginate_keyset
 
 logger = logging.getLogger(__file__)
 
@@ -41,29 +51,20 @@ def ownership_post(data:dict) -> Response:
 
     See tapir/site-src/admin/code/process-ownership-head.php.m4
 
-    Note: This doesn't do "bulk" mode
+    For accepting many requests at once see :func:`ownership_bulk_post`.
     """
     session = get_db(current_app).session
     oreq = data['ownership']
     if request.method == 'POST':
-        admin_id = 1234 #request.auth.user.user_id
         if 'make_owner' in request.form:
-            already_owns = set([doc.document_id for doc in oreq.user.owned_papers])
             docs_to_own = set([ int(key.split('_')[1]) for key, _ in request.form.items()
                             if key.startswith('approve_')])
+            already_owns = owned_document_ids(oreq.user.user_id, docs_to_own)
             to_add_ownership = docs_to_own - already_owns
 
             is_author = 1 if request.form['is_author'] else 0
-            cookie = request.cookies.get(current_app.config['CLASSIC_TRACKING_COOKIE'])
-            now = int(datetime.now().astimezone(current_app.config['ARXIV_BUSINESS_TZ']).timestamp())
-
-            for doc_id in to_add_ownership:
-                stmt = insert(t_arXiv_paper_owners).values(
-                    document_id=doc_id, user_id=oreq.user.user_id, date=now,
-                    added_by=admin_id, remote_addr=request.remote_addr, tracking_cookie=cookie,
-                    flag_auto=0, flag_author=is_author)
-                session.execute(stmt)
-                #audit_admin(oreq.user_id, 'add-paper-owner-2', doc_id)
+            add_paper_owners([(oreq.user.user_id, doc_id) for doc_id in sorted(to_add_ownership)],
+                             is_author)
 
             oreq.workflow_status = 'accepted'
             session.execute(update(OwnershipRequests)
@@ -88,31 +89,117 @@ def ownership_post(data:dict) -> Response:
             abort(400)
 
     session.commit()
+    get_count_cache(current_app).invalidate()
+    get_user_cache(current_app).invalidate([oreq.user_id])
     return data
 
 
+def add_paper_owners(owners: List[Tuple[int, int]], is_author: int) -> None:
+    """Make users owners of papers and audit it.
+
+    `owners` is a list of (user_id, document_id). All the arXiv_paper_owners
+    rows are written with one executemany INSERT, and so are the
+    "add-paper-owner-2" tapir_admin_audit rows when the session commits,
+    instead of a round trip per paper.
+
+    Does not call commit.
+    """
+    if not owners:
+        return
+    session = get_db(current_app).session
+    admin_id = request.auth.user.user_id
+    cookie = request.cookies.get(current_app.config['CLASSIC_TRACKING_COOKIE'], '')
+    now = int(datetime.now().astimezone(current_app.config['ARXIV_BUSINESS_TZ']).timestamp())
+    session.execute(insert(t_arXiv_paper_owners),
+                    [dict(document_id=doc_id, user_id=user_id, date=now,
+                          added_by=admin_id, remote_addr=request.remote_addr, tracking_cookie=cookie,
+                          flag_auto=0, flag_author=is_author)
+                     for user_id, doc_id in owners])
+    audit_admin_many([(user_id, str(doc_id)) for user_id, doc_id in owners], 'add-paper-owner-2')
+
+
+def ownership_bulk_post(request_ids: List[int], is_author: int) -> dict:
+    """Accept many pending ownership requests in one transaction.
+
+    This is the "bulk" mode of legacy tapir. Each request's user is made owner
+    of all the papers in the request that they don't already own.
+    """
+    session = get_db(current_app).session
+    oreqs = session.scalars(select(OwnershipRequests)
+                            .options(selectinload(OwnershipRequests.documents))
+                            .where(OwnershipRequests.request_id.in_(request_ids))
+                            .where(OwnershipRequests.workflow_status == 'pending')).all()
+    if not oreqs:
+        abort(400)
+
+    wanted = {(oreq.user_id, doc.document_id) for oreq in oreqs for doc in oreq.documents}
+    owned_stmt = (select(t_arXiv_paper_owners.c.user_id, t_arXiv_paper_owners.c.document_id)
+                  .where(t_arXiv_paper_owners.c.user_id.in_(sorted({user for user, _ in wanted})))
+                  .where(t_arXiv_paper_owners.c.document_id.in_(sorted({doc for _, doc in wanted}))))
+    already_owned = wanted & {tuple(row) for row in session.execute(owned_stmt)}
+
+    add_paper_owners(sorted(wanted - already_owned), is_author)
+    session.execute(update(OwnershipRequests)
+                    .where(OwnershipRequests.request_id.in_([oreq.request_id for oreq in oreqs]))
+                    .values(workflow_status='accepted'))
+    session.commit()
+    get_count_cache(current_app).invalidate()
+    get_user_cache(current_app).invalidate({oreq.user_id for oreq in oreqs})
+    return dict(success='accepted',
+                success_requests=len(oreqs),
+                success_count=len(wanted - already_owned),
+                success_already_owned=len(already_owned))
+
+
+DETAIL_LOADER_OPTIONS = (
+    joinedload(OwnershipRequests.user).selectinload(TapirUsers.tapir_nicknames),
+    selectinload(OwnershipRequests.request_audit),
+    selectinload(OwnershipRequests.documents),
+    selectinload(OwnershipRequests.endorsement_request).joinedload(EndorsementRequests.audit),
+)
+"""Loader options for :func:`ownership_detail`.
+
+Only the many-to-one user is joined. The collections are loaded with one
+SELECT ... IN each so that joining them does not multiply the rows. The user's
+owned papers are not loaded at all, use :func:`owned_document_ids`."""
+
+
+def owned_document_ids(user_id: int, document_ids: Iterable[int],
+                       session: Optional[Session] = None) -> Set[int]:
+    """Get which of `document_ids` are already owned by the user.
+
+    This only looks up the papers in question, the user may own thousands.
+    `session` defaults to the primary DB session.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return set()
+    session = session or get_db(current_app).session
+    stmt = (select(t_arXiv_paper_owners.c.document_id)
+            .where(t_arXiv_paper_owners.c.user_id == user_id)
+            .where(t_arXiv_paper_owners.c.document_id.in_(document_ids)))
+    return set(session.scalars(stmt))
+
+
 @blueprint.route('/<int:ownership_id>', methods=['GET', 'POST'])
 def ownership_detail(ownership_id:int, postfn=None) -> dict:
     """Display a ownership request.
 
+    Without a `postfn` this only reads, so it reads from the replica if there
+    is one.
     """
-    session = get_db(current_app).session
+    session = get_db(current_app).session if postfn else read_session(current_app)
     stmt = (select(OwnershipRequests)
-            .options(
-                joinedload(OwnershipRequests.user).joinedload(TapirUsers.tapir_nicknames),
-                joinedload(OwnershipRequests.user).joinedload(TapirUsers.owned_papers),
-                joinedload(OwnershipRequests.request_audit),
-                joinedload(OwnershipRequests.documents),
-                joinedload(OwnershipRequests.endorsement_request).joinedload(EndorsementRequests.audit)
-            )
+            .options(*DETAIL_LOADER_OPTIONS)
             .where( OwnershipRequests.request_id == ownership_id))
     oreq = session.scalar(stmt)
     if not oreq:
         abort(404)
 
-    already_owns =[paper.paper_id for paper in oreq.user.owned_papers]
+    already_owns = owned_document_ids(oreq.user_id, [paper.document_id for paper in oreq.documents],
+                                      session)
     for paper in oreq.documents:
-        setattr(paper, 'already_owns', paper.paper_id in already_owns)
+        setattr(paper, 'already_owns', paper.document_id in already_owns)
 
     endorsement_req = oreq.endorsement_request if oreq.endorsement_request else None
     data = dict(ownership=oreq,
@@ -129,13 +216,62 @@ def ownership_detail(ownership_id:int, postfn=None) -> dict:
 
     return data
 
-def ownership_listing(workflow_status:str, per_page:int, page: int,
-                       days_back:int) -> dict:
-    session = get_db(current_app).session
+OWNERSHIP_FILTERS = ('user_id', 'nickname', 'email', 'paper_id', 'remote_addr',
+                     'since', 'until')
+"""Filters of :func:`ownership_listing`."""
+
+
+def _filter_requests(stmt: Select, filters: Dict[str, Any]) -> Select:
+    """Add the `filters` to a select of ownership requests.
+
+    Each filter is a lookup on an index, see :mod:`admin_webapp.indexes`. It
+    is a subquery, rather than a join, so the database can start from the
+    filter's index and there is still one row per request. Nicknames and
+    emails are unique, so they are compared with the user's ID.
+    """
+    if filters.get('user_id') is not None:
+        stmt = stmt.where(OwnershipRequests.user_id == filters['user_id'])
+    if filters.get('nickname'):
+        stmt = stmt.where(OwnershipRequests.user_id == (
+            select(TapirNicknames.user_id)
+            .where(TapirNicknames.nickname == filters['nickname'])
+            .scalar_subquery()))
+    if filters.get('email'):
+        stmt = stmt.where(OwnershipRequests.user_id == (
+            select(TapirUsers.user_id)
+            .where(TapirUsers.email == filters['email'])
+            .scalar_subquery()))
+    if filters.get('paper_id'):
+        papers = t_arXiv_ownership_requests_papers
+        stmt = stmt.where(OwnershipRequests.request_id.in_(
+            select(papers.c.request_id)
+            .join(Documents, Documents.document_id == papers.c.document_id)
+            .where(Documents.paper_id == filters['paper_id'])))
+
+    audit = []
+    if filters.get('remote_addr'):
+        audit.append(OwnershipRequestsAudit.remote_addr == filters['remote_addr'])
+    if filters.get('since'):
+        audit.append(OwnershipRequestsAudit.date >= filters['since'])
+    if filters.get('until'):
+        audit.append(OwnershipRequestsAudit.date < filters['until'])
+    if audit:
+        stmt = stmt.where(OwnershipRequests.request_id.in_(
+            select(OwnershipRequestsAudit.request_id).where(*audit)))
+    return stmt
+
+
+def ownership_listing_statements(workflow_status: str, days_back: int,
+                                 filters: Optional[Dict[str, Any]] = None) \
+                                 -> Tuple[Select, Select]:
+    """Get the selects of the requests and of their count for a listing.
+
+    See :func:`ownership_listing`.
+    """
+    filters = filters or {}
     report_stmt = (select(OwnershipRequests)
                    .options(joinedload(OwnershipRequests.user))
-                   .filter(OwnershipRequests.workflow_status == workflow_status)
-                   .limit(per_page).offset((page -1) * per_page))
+                   .filter(OwnershipRequests.workflow_status == workflow_status))
     count_stmt = (select(func.count(OwnershipRequests.request_id))
                   .where(OwnershipRequests.workflow_status == workflow_status))
 
@@ -144,7 +280,148 @@ def ownership_listing(workflow_status:str, per_page:int, page: int,
         report_stmt = report_stmt.join(OwnershipRequestsAudit).filter( OwnershipRequestsAudit.date > window)
         count_stmt = count_stmt.join(OwnershipRequestsAudit).filter(OwnershipRequestsAudit.date > window)
 
-    oreqs = session.scalars(report_stmt)
-    count = session.execute(count_stmt).scalar_one()
-    pagination = Pagination(query=None, page=page, per_page=per_page, total=count, items=None)
-    return dict(pagination=pagination, count=count, ownership_requests=oreqs, worflow_status=workflow_status, days_back=days_back)
+    return _filter_requests(report_stmt, filters), _filter_requests(count_stmt, filters)
+
+
+def ownership_listing(workflow_status:str, per_page:int, page: int,
+                       days_back:int, cursor: Optional[str] = None,
+                       use_primary: bool = False,
+                       filters: Optional[Dict[str, Any]] = None) -> dict:
+    """Get a page of ownership requests with `workflow_status`.
+
+    If `cursor` is `None` this pages with LIMIT/OFFSET using `page`. Otherwise
+    it seeks on `request_id` from `cursor` and ignores `page`, so deep pages
+    cost the same as the first one. See
+    :mod:`admin_webapp.controllers.pagination`.
+
+    `filters` narrows the requests down by any of :data:`OWNERSHIP_FILTERS`:
+    the user's ``user_id``, ``nickname`` or ``email``, a ``paper_id`` in the
+    request, the ``remote_addr`` it was made from, and the datetimes it was
+    made ``since`` and ``until``. The count of a filtered listing is not
+    cached.
+
+    This reads from the replica if there is one, unless `use_primary` is set
+    to see changes just made.
+    """
+    filters = {key: value for key, value in (filters or {}).items()
+               if value is not None and value != ''}
+    session = get_db(current_app).session if use_primary else read_session(current_app)
+    report_stmt, count_stmt = ownership_listing_statements(workflow_status, days_back,
+                                                           filters)
+
+    count_limit = current_app.config['OWNERSHIP_COUNT_LIMIT']
+    if count_limit:
+        # Stop counting at the limit, the listing shows this as "N+"
+        count_stmt = select(func.count()).select_from(
+            count_stmt.with_only_columns(OwnershipRequests.request_id)
+            .limit(count_limit).subquery())
+
+    if filters:
+        # Not cached, each search would leave an entry in every worker
+        count = session.execute(count_stmt).scalar_one()
+    else:
+        count = get_count_cache(current_app).get(
+            ('ownership', workflow_status, days_back, count_limit),
+            current_app.config['OWNERSHIP_COUNT_CACHE_TTL'],
+            lambda: session.execute(count_stmt).scalar_one())
+    if cursor is None:
+        report_stmt = (report_stmt.order_by(OwnershipRequests.request_id)
+                       .limit(per_page).offset((page -1) * per_page))
+        oreqs = session.scalars(report_stmt)
+        pagination = Pagination(query=None, page=page, per_page=per_page, total=count, items=None)
+    else:
+        pagination = paginate_keyset(session, report_stmt, OwnershipRequests.request_id,
+                                     cursor, per_page)
+        oreqs = pagination.items
+    return dict(pagination=pagination, count=count, count_capped=bool(count_limit) and count >= count_limit,
+                ownership_requests=oreqs, worflow_status=workflow_status, days_back=days_back)
+
+
+EXPORT_COLUMNS = ('request_id', 'workflow_status', 'user_id', 'email',
+                  'endorsement_request_id', 'date', 'remote_addr', 'paper_ids')
+"""Fields of each ownership request in an export."""
+
+EXPORT_BATCH_SIZE = 1000
+"""Rows fetched from the DB cursor at a time in an export."""
+
+
+def _export_rows(workflow_status: Optional[str], since: Optional[datetime],
+                 until: Optional[datetime]) -> Iterator[tuple]:
+    """Stream the ownership requests to export, ordered by request ID.
+
+    The rows come from a server side cursor a batch at a time, and only
+    columns are selected, so memory use doesn't grow with the number of rows.
+    The papers of each request are a subquery instead of a join so there is
+    one row per request without a GROUP BY.
+    """
+    papers = t_arXiv_ownership_requests_papers
+    paper_ids = (select(func.group_concat(Documents.paper_id))
+                 .select_from(papers.join(Documents,
+                                          Documents.document_id == papers.c.document_id))
+                 .where(papers.c.request_id == OwnershipRequests.request_id)
+                 .scalar_subquery())
+    stmt = (select(OwnershipRequests.request_id, OwnershipRequests.workflow_status,
+                   OwnershipRequests.user_id, TapirUsers.email,
+                   OwnershipRequests.endorsement_request_id,
+                   OwnershipRequestsAudit.date, OwnershipRequestsAudit.remote_addr,
+                   paper_ids)
+            .outerjoin(TapirUsers, TapirUsers.user_id == OwnershipRequests.user_id)
+            .outerjoin(OwnershipRequestsAudit)
+            .order_by(OwnershipRequests.request_id))
+    if workflow_status is not None:
+        stmt = stmt.where(OwnershipRequests.workflow_status == workflow_status)
+    if since is not None:
+        stmt = stmt.where(OwnershipRequestsAudit.date >= since)
+    if until is not None:
+        stmt = stmt.where(OwnershipRequestsAudit.date < until)
+
+    result = read_session(current_app).execute(
+        stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _export_value(value: object) -> object:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def ownership_export(export_format: str, workflow_status: Optional[str] = None,
+                     since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> Iterator[str]:
+    """Export ownership requests as CSV or JSON Lines.
+
+    Parameters
+    ----------
+    export_format : str
+        ``csv``, with a header row, or ``jsonl``.
+    workflow_status : str or None
+        Only export requests with this status, all of them if `None`.
+    since : datetime or None
+        Only export requests made at or after this.
+    until : datetime or None
+        Only export requests made before this.
+
+    Returns
+    -------
+    Iterator
+        Chunks of the export, a batch of rows each, to stream in a response.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(EXPORT_COLUMNS)
+
+    count = 0
+    for row in _export_rows(workflow_status, since, until):
+        values = [_export_value(value) for value in row]
+        if export_format == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values))) + '\n')
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
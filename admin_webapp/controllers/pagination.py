@@ -0,0 +1,125 @@
+"""Keyset (seek) pagination for admin listings.
+
+Offset pagination makes the database read and discard every row before the
+requested page, so deep pages get slower as a table grows. Keyset pagination
+instead remembers the key of the last (or first) row shown and seeks past it
+with an indexed ``WHERE key > :last`` so every page costs the same.
+
+The position is passed between requests as an opaque cursor token. An empty
+cursor means the first page.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from werkzeug.exceptions import BadRequest
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class KeysetPagination:
+    """A page of results from :func:`paginate_keyset`.
+
+    Unlike :class:`flask_sqlalchemy.Pagination` this does not know the total
+    number of pages, only whether there are pages before and after it.
+    """
+
+    keyset = True
+    """Lets templates tell this apart from offset pagination."""
+
+    def __init__(self, items: List[Any], per_page: int,
+                 next_cursor: Optional[str], prev_cursor: Optional[str]):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self) -> bool:
+        """True if there is a page after this one."""
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        """True if there is a page before this one."""
+        return self.prev_cursor is not None
+
+
+def encode_cursor(direction: str, key: int) -> str:
+    """Make an opaque cursor token to seek from ``key`` in ``direction``."""
+    raw = f'{direction}:{key}'.encode('ascii')
+    return urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Optional[int]]:
+    """Decode a cursor token made by :func:`encode_cursor`.
+
+    Returns
+    -------
+    tuple
+        The direction, :const:`NEXT` or :const:`PREV`, and the key to seek
+        from. The key is ``None`` for the first page.
+
+    Raises
+    ------
+    :class:`werkzeug.exceptions.BadRequest`
+        If the cursor is not a valid token.
+    """
+    if not cursor:
+        return NEXT, None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, key = urlsafe_b64decode(padded).decode('ascii').split(':')
+        if direction not in (NEXT, PREV):
+            raise ValueError(f'Unknown direction {direction}')
+        return direction, int(key)
+    except ValueError as ex:  # binascii.Error and UnicodeError are ValueErrors
+        raise BadRequest('Invalid cursor') from ex  # type: ignore
+
+
+def paginate_keyset(session: Session, stmt: Select, key_column: Any,
+                    cursor: str, per_page: int) -> KeysetPagination:
+    """Get one page of ``stmt`` by seeking on ``key_column``.
+
+    Parameters
+    ----------
+    session : Session
+        Session to run the query on.
+    stmt : Select
+        An ORM select of the rows to page through. It must not already have an
+        ``ORDER BY``, ``LIMIT`` or ``OFFSET``.
+    key_column : InstrumentedAttribute
+        A unique, indexed column of the selected entity, ex. the primary key.
+        Pages are in ascending order of this column.
+    cursor : str
+        A cursor from a previous page, or empty for the first page.
+    per_page : int
+        Number of rows per page.
+    """
+    direction, key = decode_cursor(cursor)
+    if key is None:
+        stmt = stmt.order_by(key_column)
+    elif direction == NEXT:
+        stmt = stmt.where(key_column > key).order_by(key_column)
+    else:
+        stmt = stmt.where(key_column < key).order_by(key_column.desc())
+
+    # One extra row tells us if there is another page without a COUNT
+    rows = list(session.scalars(stmt.limit(per_page + 1)))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == PREV:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = key is not None, has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(NEXT, getattr(rows[-1], key_column.key))
+    if rows and has_prev:
+        prev_cursor = encode_cursor(PREV, getattr(rows[0], key_column.key))
+    return KeysetPagination(rows, per_page, next_cursor, prev_cursor)
@@ -9,7 +9,8 @@ affiliation information, and links to external identities such as GitHub and
 ORCID.
 """
 
-from typing import Dict, Tuple, Any, Optional
+from functools import lru_cache
+from typing import Dict, List, Tuple, Any, Optional
 from werkzeug.datastructures import MultiDict
 from werkzeug.exceptions import BadRequest, InternalServerError
 
@@ -23,18 +24,21 @@ from wtforms import StringField, PasswordField, SelectField, \
     BooleanField, Form, HiddenField
 from wtforms.validators import DataRequired, Email, Length, URL, optional, \
     ValidationError
-from flask import url_for, Markup
-import pycountry
+from flask import url_for, Markup, current_app
+from sqlalchemy import select, exists
+from sqlalchemy.exc import OperationalError
+
+from arxiv_db.models import TapirNicknames, TapirUsers
 
-from arxiv import taxonomy
 from .util import MultiCheckboxField, OptGroupSelectField
 
 from .. import stateless_captcha
+from ..extensions import get_db, get_taken_cache
 
 from arxiv_auth import legacy
 from arxiv_auth.legacy import accounts
 from arxiv_auth.legacy.exceptions import RegistrationFailed, \
-    SessionCreationFailed, SessionDeletionFailed
+    SessionCreationFailed, SessionDeletionFailed, Unavailable
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +109,9 @@ def register(method: str, params: MultiDict, captcha_secret: str, ip: str,
         except RegistrationFailed as e:
             msg = 'Registration failed'
             raise InternalServerError(msg) from e  # type: ignore
+        cache = get_taken_cache(current_app)
+        cache.add('username', form.username.data)
+        cache.add('email', form.email.data)
 
         # Log the user in.
         session, cookie = _login(user, auth, ip)
@@ -120,6 +127,75 @@ def register(method: str, params: MultiDict, captcha_secret: str, ip: str,
     return data, status.HTTP_200_OK, {}
 
 
+TAKEN_COLUMNS = {'username': TapirNicknames.nickname, 'email': TapirUsers.email}
+"""Columns holding the usernames and emails of existing accounts."""
+
+
+def taken(username: Optional[str], email: Optional[str]) -> Dict[str, bool]:
+    """Check if a username and an email are used by existing accounts.
+
+    Both are checked in one query. Values that are known to be taken are
+    answered from the :class:`.TakenCache` without a query.
+
+    Parameters
+    ----------
+    username : str or None
+    email : str or None
+        A value that is `None` or empty is not checked and is not taken.
+
+    Returns
+    -------
+    dict
+        Whether each of ``'username'`` and ``'email'`` is taken.
+
+    Raises
+    ------
+    :class:`Unavailable`
+        If the database can't be reached.
+    """
+    cache = get_taken_cache(current_app)
+    values = {'username': username, 'email': email}
+    result = {kind: bool(value) and cache.is_taken(kind, value)  # type: ignore
+              for kind, value in values.items()}
+    unknown = [kind for kind, value in values.items()
+               if value and not result[kind]]
+    if not unknown:
+        return result
+    query = select(*[exists().where(TAKEN_COLUMNS[kind] == values[kind])
+                     .label(kind) for kind in unknown])
+    try:
+        row = get_db(current_app).session.execute(query).one()
+    except OperationalError as e:
+        raise Unavailable('Database is temporarily unavailable') from e
+    for kind in unknown:
+        result[kind] = bool(row._mapping[kind])
+        if result[kind]:
+            cache.add(kind, values[kind])  # type: ignore
+    return result
+
+
+def availability(params: MultiDict) -> ResponseData:
+    """Check if a username and an email can be used for a new account.
+
+    This is for the live checks on the registration form, so it is called on
+    keystrokes. Only the values in ``params`` are checked, a value that fails
+    the form's validation is not looked up.
+    """
+    form = RegistrationForm(params)
+    fields = [field for field in (form.username, form.email)
+              if field.name in params]
+    if not fields:
+        raise BadRequest('Pass a username or an email')  # type: ignore
+    valid = {field.name: field.validate(form) for field in fields}
+    found = taken(form.username.data if valid.get('username') else None,
+                  form.email.data if valid.get('email') else None)
+    data = {}
+    for field in fields:
+        errors = list(field.errors)
+        if found[field.name]:
+            errors.append(f'That {field.name} is already taken')
+        data[field.name] = {'available': not errors, 'errors': errors}
+    return data, status.HTTP_200_OK, {'Cache-Control': 'no-store'}
 
 
 def edit_profile(method: str, user_id: str, session: domain.Session,
@@ -162,18 +238,33 @@ def edit_profile(method: str, user_id: str, session: domain.Session,
     return data, status.HTTP_200_OK, {}
 
 
-class ProfileForm(Form):
-    """User registration form."""
+# The choices are built on first use rather than at import, so workers that
+# never show the form don't load pycountry or the taxonomy.
 
-    COUNTRIES = [('', '')] + \
+@lru_cache(maxsize=None)
+def country_choices() -> List[Tuple[str, str]]:
+    """Get the choices of country."""
+    import pycountry  # pylint: disable=import-outside-toplevel
+    return [('', '')] + \
         [(country.alpha_2, country.name) for country in pycountry.countries]
-    RANKS = [('', '')] + domain.RANKS
-    GROUPS = [
+
+
+@lru_cache(maxsize=None)
+def group_choices() -> List[Tuple[str, str]]:
+    """Get the choices of submission group."""
+    from arxiv import taxonomy  # pylint: disable=import-outside-toplevel
+    return [
         (key, group['name'])
         for key, group in taxonomy.definitions.GROUPS.items()
         if not group.get('is_test', False)
     ]
-    CATEGORIES = [
+
+
+@lru_cache(maxsize=None)
+def category_choices() -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Get the choices of category, grouped by archive."""
+    from arxiv import taxonomy  # pylint: disable=import-outside-toplevel
+    return [
         (archive['name'], [
             (category_id, category['name'])
             for category_id, category in taxonomy.CATEGORIES_ACTIVE.items()
@@ -181,7 +272,12 @@ class ProfileForm(Form):
         ])
         for archive_id, archive in taxonomy.ARCHIVES_ACTIVE.items()
     ]
-    """Categories grouped by archive."""
+
+
+class ProfileForm(Form):
+    """User registration form."""
+
+    RANKS = [('', '')] + domain.RANKS
 
     user_id = HiddenField('User ID')
 
@@ -197,15 +293,15 @@ class ProfileForm(Form):
                     '<a href="https://arxiv.org/tex_accents">'
                     'pidgin TeX (\\\'o)</a> for foreign characters.'
     )
-    country = SelectField('Country', choices=COUNTRIES,
+    country = SelectField('Country', choices=country_choices,
                           validators=[DataRequired()])
     status = SelectField('Academic Status', choices=RANKS,
                          validators=[DataRequired()])
 
     groups = MultiCheckboxField('Group(s) to which you would like to submit',
-                                choices=GROUPS, default='')
+                                choices=group_choices, default='')
     default_category = OptGroupSelectField('Your default category',
-                                           choices=CATEGORIES, default='')
+                                           choices=category_choices, default='')
 
     url = StringField('Your homepage URL', validators=[optional(),
                       Length(max=255), URL()])
@@ -304,9 +400,19 @@ class RegistrationForm(Form):
         self.captcha_secret = captcha_secret
         self.ip = ip
 
+    def validate(self, extra_validators: Any = None) -> bool:
+        """Validate the form, looking up the username and email once."""
+        self._taken: Optional[Dict[str, bool]] = None
+        return super(RegistrationForm, self).validate(extra_validators)
+
+    def _is_taken(self, kind: str) -> bool:
+        if getattr(self, '_taken', None) is None:
+            self._taken = taken(self.username.data, self.email.data)
+        return self._taken[kind]  # type: ignore
+
     def validate_username(self, field: StringField) -> None:
         """Ensure that the username is unique."""
-        if accounts.does_username_exist(field.data):
+        if self._is_taken('username'):
             raise ValidationError(Markup(
                 f'An account with that email already exists. You can try'
                 f' <a href="{url_for("ui.login")}?next_page={self.next_page}">'
@@ -316,7 +422,7 @@ class RegistrationForm(Form):
 
     def validate_email(self, field: StringField) -> None:
         """Ensure that the email address is unique."""
-        if accounts.does_email_exist(field.data):
+        if self._is_taken('email'):
             raise ValidationError(Markup(
                 f'An account with that email already exists. You can try'
                 f' <a href="{url_for("ui.login")}?next_page={self.next_page}">'
@@ -9,13 +9,14 @@ from base64 import b64encode
 
 from flask import Flask
 from werkzeug.datastructures import MultiDict
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, InternalServerError
 
 from arxiv import status
 
 from arxiv_auth import domain
 from arxiv_auth.legacy import exceptions, util, models
 
+from ... import timing
 from ...factory import create_web_app
 from ...controllers.authentication import login, logout, LoginForm
 
@@ -122,6 +123,24 @@ class TestAuthenticationController(TestCase):
         self.assertEqual(header['Location'], next_page,
                          "Redirects user to next page.")
 
+    @mock.patch('admin_webapp.controllers.authentication.SessionStore')
+    @mock.patch('admin_webapp.controllers.authentication.legacy_cookies')
+    @mock.patch('admin_webapp.controllers.authentication._do_logout')
+    def test_logout_outbox(self, mock_do_logout, mock_cookies, mock_SessionStore):
+        """With a logout outbox, the legacy session is invalidated later."""
+        mock_cookies.unpack.return_value = ('4', '1', '10.1.2.3', None, None, '')
+        outbox = mock.MagicMock()
+        self.app.extensions['logout_outbox'] = outbox
+        with self.app.app_context():
+            data, status_code, header = logout('foosession', 'bazsession', '/')
+        self.assertEqual(status_code, status.HTTP_303_SEE_OTHER,
+                         "Redirects user to next page")
+        self.assertEqual(data['cookies']['classic_cookie'], ('', 0),
+                         "Classic cookie is cleared")
+        mock_cookies.unpack.assert_called_once_with('bazsession')
+        outbox.put.assert_called_once_with('4')
+        mock_do_logout.assert_not_called()
+
     @mock.patch('admin_webapp.controllers.authentication.SessionStore')
     @mock.patch('admin_webapp.controllers.authentication.legacy_sessions')
     def test_logout_anonymous(self, mock_legacy_ses, mock_SessionStore):
@@ -234,6 +253,53 @@ class TestAuthenticationController(TestCase):
         self.assertEqual(data['cookies']['classic_cookie'], (c_cookie, None),
                          "Classic session cookie is returned")
 
+    def _mock_login(self, mock_authenticate, mock_SessionStore, mock_session):
+        start_time = datetime.now(tz=UTC)
+        user = domain.User(user_id=42, username='foouser',
+                           email='user@ema.il', verified=True)
+        auths = domain.Authorizations(classic=6, scopes=['public:read'])
+        mock_authenticate.return_value = user, auths
+        mock_session.create.return_value = domain.Session(
+            session_id='barsession', user=user, start_time=start_time,
+            authorizations=auths)
+        mock_session.generate_cookie.return_value = 'bardata'
+        sessions = mock_SessionStore.current_session.return_value
+        sessions.create.return_value = domain.Session(
+            session_id='foosession', user=user, start_time=start_time,
+            authorizations=auths)
+        sessions.generate_cookie.return_value = 'foodata'
+        return sessions
+
+    @mock.patch('admin_webapp.controllers.authentication.legacy_sessions')
+    @mock.patch('admin_webapp.controllers.authentication.SessionStore')
+    @mock.patch('admin_webapp.controllers.authentication.authenticate')
+    def test_post_great_parallel(self, mock_authenticate, mock_SessionStore, mock_session):
+        """Both sessions are created at the same time."""
+        self._mock_login(mock_authenticate, mock_SessionStore, mock_session)
+        self.app.config['LOGIN_SESSION_THREADS'] = 2
+        form_data = MultiDict({'username': 'foouser', 'password': 'bazpass'})
+        with self.app.app_context():
+            data, status_code, header = login('POST', form_data, '123.45.67.89', '/foo')
+            spans = {name for name, _ in timing.current().spans}
+        self.assertEqual(status_code, status.HTTP_303_SEE_OTHER)
+        self.assertEqual(data['cookies']['auth_session_cookie'], ('foodata', None))
+        self.assertEqual(data['cookies']['classic_cookie'], ('bardata', None))
+        self.assertEqual(spans, {'form', 'authn', 'session', 'cookie', 'legacy_session'})
+
+    @mock.patch('admin_webapp.controllers.authentication.legacy_sessions')
+    @mock.patch('admin_webapp.controllers.authentication.SessionStore')
+    @mock.patch('admin_webapp.controllers.authentication.authenticate')
+    def test_post_parallel_legacy_fails(self, mock_authenticate, mock_SessionStore, mock_session):
+        """The session is deleted if the legacy session can't be created."""
+        sessions = self._mock_login(mock_authenticate, mock_SessionStore, mock_session)
+        mock_session.create.side_effect = exceptions.SessionCreationFailed('nope')
+        self.app.config['LOGIN_SESSION_THREADS'] = 2
+        form_data = MultiDict({'username': 'foouser', 'password': 'bazpass'})
+        with self.app.app_context():
+            with self.assertRaises(InternalServerError):
+                login('POST', form_data, '123.45.67.89', '/foo')
+        sessions.delete.assert_called_once_with('foodata')
+
     @mock.patch('admin_webapp.controllers.authentication.SessionStore')
     @mock.patch('admin_webapp.controllers.authentication.legacy_sessions')
     @mock.patch('admin_webapp.controllers.authentication.authenticate')
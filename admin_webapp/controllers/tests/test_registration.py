@@ -5,6 +5,8 @@ from unittest import TestCase, mock
 import hashlib
 from base64 import b64encode
 import os
+import subprocess
+import sys
 import unittest
 
 from werkzeug.datastructures import MultiDict
@@ -16,7 +18,10 @@ from arxiv_auth.legacy import util, models
 
 from admin_webapp.factory import create_web_app
 
-from ..registration import register, edit_profile #, view_profile
+from ..registration import register, edit_profile, ProfileForm, \
+    country_choices, group_choices, category_choices, taken #, view_profile
+from ... import query_stats
+from ...taken_cache import TakenCache
 from ...stateless_captcha import InvalidCaptchaValue, InvalidCaptchaToken
 
 
@@ -120,13 +125,11 @@ class TestRegister(TestCase):
     def test_post_minimum(self, captcha, users):
         """POST request with minimum required data."""
         captcha.return_value = None     # No exception -> OK.
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
         users.register.return_value = (mock.MagicMock(), mock.MagicMock())
 
         registration_data = {
             'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'fdsafdsa',
             'forename': 'Bob',
@@ -168,12 +171,9 @@ class TestRegister(TestCase):
     @mock.patch('admin_webapp.controllers.registration.accounts')
     def test_missing_data(self, users):
         """POST request missing a required field."""
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
-
         registration_data = {
             'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'fdsafdsa',
             'forename': 'Bob',
@@ -198,11 +198,9 @@ class TestRegister(TestCase):
     @mock.patch('admin_webapp.controllers.registration.accounts')
     def test_password_mismatch(self, users):
         """POST with all required data, but passwords don't match."""
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
         registration_data = {
             'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'notthesamepassword',
             'forename': 'Bob',
@@ -223,10 +221,8 @@ class TestRegister(TestCase):
     @mock.patch('admin_webapp.controllers.registration.accounts')
     @mock.patch('admin_webapp.controllers.registration.stateless_captcha.check')
     def test_existing_username(self, captcha, users):
-        """POST valid data, but username already exists."""
+        """POST valid data, but the username of the seeded user."""
         captcha.return_value = None     # No exception -> OK.
-        users.does_username_exist.return_value = True
-        users.does_email_exist.return_value = False
         users.register.return_value = (mock.MagicMock(), mock.MagicMock())
 
         registration_data = {
@@ -254,15 +250,13 @@ class TestRegister(TestCase):
     @mock.patch('admin_webapp.controllers.registration.stateless_captcha.check')
     @unittest.skip("not in use and not ready to use")
     def test_existing_email(self, captcha, users):
-        """POST valid data, but email already exists."""
+        """POST valid data, but the email of the seeded user."""
         captcha.return_value = None     # No exception -> OK.
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = True
         users.register.return_value = (mock.MagicMock(), mock.MagicMock())
 
         registration_data = {
-            'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'email': 'first@last.iv',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'fdsafdsa',
             'forename': 'Bob',
@@ -289,13 +283,11 @@ class TestRegister(TestCase):
             raise InvalidCaptchaValue('Nope')
 
         captcha.side_effect = raise_invalid_value
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
         users.register.return_value = (mock.MagicMock(), mock.MagicMock())
 
         registration_data = {
             'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'fdsafdsa',
             'forename': 'Bob',
@@ -323,13 +315,11 @@ class TestRegister(TestCase):
             raise InvalidCaptchaToken('Nope')
 
         captcha.side_effect = raise_invalid_token
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
         users.register.return_value = (mock.MagicMock(), mock.MagicMock())
 
         registration_data = {
             'email': 'foo@bar.edu',
-            'username': 'foouser',
+            'username': 'newuser',
             'password': 'fdsafdsa',
             'password2': 'fdsafdsa',
             'forename': 'Bob',
@@ -366,8 +356,6 @@ class TestRegister(TestCase):
     def test_post_minimum(self, users, create, invalidate):
         """POST request with minimum required data."""
         users.get_user_by_id.return_value = mock.MagicMock(user_id=1)
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = False
         users.update.return_value = (mock.MagicMock(), mock.MagicMock())
         current_session = mock.MagicMock(session_id='52')
 
@@ -442,8 +430,6 @@ class TestRegister(TestCase):
     def test_existing_username(self, users):
         """POST valid data, but username already exists."""
         users.get_user_by_id.return_value = mock.MagicMock(user_id=1)
-        users.does_username_exist.return_value = True
-        users.does_email_exist.return_value = False
         users.update.return_value = (mock.MagicMock(), mock.MagicMock())
         current_session = mock.MagicMock(session_id='52')
 
@@ -471,8 +457,6 @@ class TestRegister(TestCase):
     def test_existing_email(self, users):
         """POST valid data, but email already exists."""
         users.get_user_by_id.return_value = mock.MagicMock(user_id=1)
-        users.does_username_exist.return_value = False
-        users.does_email_exist.return_value = True
         users.update.return_value = (mock.MagicMock(), mock.MagicMock())
         current_session = mock.MagicMock(session_id='52')
 
@@ -494,3 +478,128 @@ class TestRegister(TestCase):
                                            params, '10.10.10.10')
         self.assertEqual(code, status.HTTP_400_BAD_REQUEST,
                          "Returns 400 response")
+
+
+class TestProfileFormChoices(TestCase):
+    """Tests for the lazily built choices of :class:`.ProfileForm`."""
+
+    def test_not_loaded_at_import(self):
+        """Importing the controllers doesn't load pycountry."""
+        code = ('import sys; import admin_webapp.controllers.registration; '
+                'print("pycountry" in sys.modules)')
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                             text=True, check=True).stdout
+        self.assertEqual(out.strip(), 'False')
+
+    def test_choices_cached(self):
+        """The choices are built once per process."""
+        self.assertIs(country_choices(), country_choices())
+        self.assertIs(category_choices(), category_choices())
+        with Flask('test').test_request_context():
+            form = ProfileForm()
+        self.assertEqual(form.country.choices, country_choices())
+        self.assertIn(('', ''), form.country.choices)
+        self.assertEqual(form.groups.choices, group_choices())
+        self.assertEqual(form.default_category.choices, category_choices())
+
+
+class TestAvailability(TestCase):
+    """Tests for :func:`taken` and the live availability check."""
+
+    def setUp(self):
+        self.db = 'availability.sqlite'
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db}'
+        self.app.config['SQL_QUERY_STATS'] = True
+        self.app.config['REDIS_FAKE'] = True
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            util.drop_all()
+            util.create_all()
+            with util.transaction() as session:
+                session.add(models.DBUser(
+                    user_id=1, first_name='first', last_name='last',
+                    email='first@last.iv', policy_class=2, flag_edit_users=1,
+                    flag_email_verified=1, flag_edit_system=0, flag_approved=1,
+                    flag_deleted=0, flag_banned=0, tracking_cookie='foocookie'))
+                session.add(models.DBUserNickname(
+                    nick_id=1, nickname='foouser', user_id=1, user_seq=1,
+                    flag_valid=1, role=0, policy=0, flag_primary=1))
+
+    def tearDown(self):
+        with self.app.app_context():
+            util.drop_all()
+        try:
+            os.remove(self.db)
+        except FileNotFoundError:
+            pass
+
+    def test_one_query(self):
+        """The username and the email are checked in one query."""
+        with self.app.app_context():
+            self.assertEqual(taken('foouser', 'new@last.iv'),
+                             {'username': True, 'email': False})
+            self.assertEqual(query_stats.current().count, 1)
+
+    def test_taken_is_cached(self):
+        """Taken values are answered without a query, free ones are not."""
+        with self.app.app_context():
+            taken('foouser', 'first@last.iv')
+            self.assertEqual(taken('foouser', 'first@last.iv'),
+                             {'username': True, 'email': True})
+            self.assertEqual(query_stats.current().count, 1)
+            taken('newuser', None)
+            taken('newuser', None)
+            self.assertEqual(query_stats.current().count, 3)
+
+    def test_available(self):
+        """GET the live check of a taken username and a free email."""
+        resp = self.client.get('/register/available',
+                               query_string={'username': 'foouser',
+                                             'email': 'new@last.iv'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.headers['Cache-Control'], 'no-store')
+        self.assertFalse(resp.json['username']['available'])
+        self.assertTrue(resp.json['email']['available'])
+
+    def test_available_invalid(self):
+        """A value that isn't valid is not available and not looked up."""
+        with mock.patch('admin_webapp.controllers.registration.taken',
+                        wraps=taken) as wrapped:
+            resp = self.client.get('/register/available',
+                                   query_string={'username': 'abc'})
+        self.assertFalse(resp.json['username']['available'])
+        self.assertTrue(resp.json['username']['errors'])
+        self.assertNotIn('email', resp.json)
+        wrapped.assert_called_once_with(None, None)
+
+    def test_available_no_values(self):
+        """GET without a username or an email."""
+        resp = self.client.get('/register/available')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestTakenCache(TestCase):
+    """Tests for :class:`.TakenCache`."""
+
+    def test_ttl(self):
+        """Values are forgotten after the TTL."""
+        cache = TakenCache(ttl=10, max_size=10)
+        with mock.patch('admin_webapp.taken_cache.monotonic', return_value=0):
+            cache.add('email', 'a@b.c')
+        with mock.patch('admin_webapp.taken_cache.monotonic', return_value=5):
+            self.assertTrue(cache.is_taken('email', 'a@b.c'))
+            self.assertFalse(cache.is_taken('username', 'a@b.c'))
+        with mock.patch('admin_webapp.taken_cache.monotonic', return_value=10):
+            self.assertFalse(cache.is_taken('email', 'a@b.c'))
+
+    def test_max_size(self):
+        """The least recently used values are dropped first."""
+        cache = TakenCache(ttl=10, max_size=2)
+        cache.add('username', 'one')
+        cache.add('username', 'two')
+        self.assertTrue(cache.is_taken('username', 'one'))
+        cache.add('username', 'three')
+        self.assertTrue(cache.is_taken('username', 'one'))
+        self.assertFalse(cache.is_taken('username', 'two'))
+        self.assertTrue(cache.is_taken('username', 'three'))
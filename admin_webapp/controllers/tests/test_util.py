@@ -0,0 +1,56 @@
+"""Tests for :mod:`admin_webapp.controllers.util`."""
+
+from unittest import TestCase
+
+from werkzeug.datastructures import MultiDict
+from wtforms import Form
+
+from ..util import MultiCheckboxField, OptGroupSelectField, _checkbox_items, \
+    _optgroup_options
+
+
+class ChoicesForm(Form):
+    category = OptGroupSelectField('Category', default='', choices=[
+        ('Computer Science', [('cs.AI', 'Artificial Intelligence'),
+                              ('cs.CL', 'Computation & Language')]),
+        ('Mathematics', [('math.AG', 'Algebraic Geometry')])])
+    groups = MultiCheckboxField('Groups', default='', choices=[
+        ('grp_cs', 'Computer Science'), ('grp_math', 'Mathematics')])
+
+
+class TestCachedOptions(TestCase):
+    """The cached option markup gets the selected values of each form."""
+
+    def test_optgroup_select(self):
+        html = ChoicesForm(MultiDict({'category': 'cs.CL'})).category()
+        self.assertIn('<optgroup label="Computer Science">', html)
+        self.assertIn('<option selected value="cs.CL">Computation &amp; Language</option>', html)
+        self.assertIn('<option value="cs.AI">Artificial Intelligence</option>', html)
+        self.assertEqual(html.count('selected'), 1)
+
+        html = ChoicesForm(MultiDict({'category': 'math.AG'})).category()
+        self.assertIn('<option selected value="math.AG">', html)
+        self.assertEqual(html.count('selected'), 1)
+
+        html = ChoicesForm().category()
+        self.assertNotIn('selected', html)
+        self.assertTrue(html.startswith('<select id="category" name="category">'
+                                        '<option></option><optgroup'))
+
+    def test_multi_checkbox(self):
+        form = ChoicesForm(MultiDict([('groups', 'grp_math')]))
+        html = form.groups(ul_class='list', li_class='item')
+        self.assertIn('<input id="groups-grp_cs" name="groups" type="checkbox" value="grp_cs" />', html)
+        self.assertIn('<input checked="checked" id="groups-grp_math" name="groups" type="checkbox" '
+                      'value="grp_math" />', html)
+        self.assertEqual(ChoicesForm().groups(li_class='item').count('checked'), 0)
+
+    def test_rendered_once(self):
+        _checkbox_items.cache_clear()
+        _optgroup_options.cache_clear()
+        for data in [{}, {'category': 'cs.AI', 'groups': 'grp_cs'}]:
+            form = ChoicesForm(MultiDict(data))
+            form.category()
+            form.groups(li_class='item')
+        self.assertEqual(_checkbox_items.cache_info().misses, 1)
+        self.assertEqual(_optgroup_options.cache_info().misses, 1)
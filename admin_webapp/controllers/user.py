@@ -0,0 +1,146 @@
+"""Controllers for the admin user page."""
+
+from datetime import datetime
+from typing import Any, Optional
+
+from flask import abort, current_app
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FromClause, ScalarSelect
+
+from arxiv_db.models import TapirUsers, TapirNicknames, TapirPolicyClasses, \
+    TapirAdminAudit, Demographics, OwnershipRequests, OwnershipRequestsAudit, \
+    EndorsementRequests
+from arxiv_db.models.associative_tables import t_arXiv_paper_owners, \
+    t_arXiv_ownership_requests_papers
+
+from admin_webapp.extensions import get_db, get_user_cache
+
+RECENT_ROWS = 10
+"""Most recent ownership requests, endorsement requests and audit rows shown."""
+
+
+def _count(table: FromClause, *criteria: Any) -> ScalarSelect:
+    """Scalar subquery of the count of rows of `table` matching `criteria`."""
+    return select(func.count()).select_from(table).where(*criteria).scalar_subquery()
+
+
+def _profile(session: Session, user_id: int) -> Optional[dict]:
+    """The user, their demographics and policy class, and counts of their rows."""
+    owners = t_arXiv_paper_owners
+    stmt = (select(TapirUsers.user_id, TapirUsers.first_name, TapirUsers.last_name,
+                   TapirUsers.suffix_name, TapirUsers.email, TapirUsers.email_bouncing,
+                   TapirUsers.joined_date, TapirUsers.joined_remote_host,
+                   TapirUsers.policy_class, TapirUsers.flag_approved,
+                   TapirUsers.flag_deleted, TapirUsers.flag_banned,
+                   TapirUsers.flag_email_verified, TapirUsers.flag_edit_users,
+                   TapirUsers.flag_edit_system,
+                   TapirPolicyClasses.name.label('policy_name'),
+                   Demographics.country, Demographics.affiliation, Demographics.url,
+                   Demographics.archive, Demographics.subject_class,
+                   Demographics.veto_status, Demographics.flag_suspect,
+                   _count(owners, owners.c.user_id == TapirUsers.user_id)
+                   .label('owned_papers'),
+                   _count(owners, owners.c.user_id == TapirUsers.user_id,
+                          owners.c.flag_author == 1)
+                   .label('authored_papers'),
+                   _count(OwnershipRequests.__table__,
+                          OwnershipRequests.user_id == TapirUsers.user_id)
+                   .label('ownership_requests'),
+                   _count(OwnershipRequests.__table__,
+                          OwnershipRequests.user_id == TapirUsers.user_id,
+                          OwnershipRequests.workflow_status == 'pending')
+                   .label('pending_ownership_requests'),
+                   _count(EndorsementRequests.__table__,
+                          EndorsementRequests.endorsee_id == TapirUsers.user_id)
+                   .label('endorsement_requests'),
+                   _count(TapirAdminAudit.__table__,
+                          TapirAdminAudit.affected_user == TapirUsers.user_id)
+                   .label('admin_actions'))
+            .outerjoin(TapirPolicyClasses,
+                       TapirPolicyClasses.class_id == TapirUsers.policy_class)
+            .outerjoin(Demographics, Demographics.user_id == TapirUsers.user_id)
+            .where(TapirUsers.user_id == user_id))
+    row = session.execute(stmt).first()
+    return row._asdict() if row else None
+
+
+def _nicknames(session: Session, user_id: int) -> list:
+    stmt = (select(TapirNicknames.nickname, TapirNicknames.flag_primary,
+                   TapirNicknames.flag_valid)
+            .where(TapirNicknames.user_id == user_id)
+            .order_by(TapirNicknames.user_seq))
+    return [row._asdict() for row in session.execute(stmt)]
+
+
+def _ownership_requests(session: Session, user_id: int) -> list:
+    papers = t_arXiv_ownership_requests_papers
+    stmt = (select(OwnershipRequests.request_id, OwnershipRequests.workflow_status,
+                   OwnershipRequestsAudit.date,
+                   _count(papers, papers.c.request_id == OwnershipRequests.request_id)
+                   .label('papers'))
+            .outerjoin(OwnershipRequestsAudit,
+                       OwnershipRequestsAudit.request_id == OwnershipRequests.request_id)
+            .where(OwnershipRequests.user_id == user_id)
+            .order_by(OwnershipRequests.request_id.desc())
+            .limit(RECENT_ROWS))
+    return [row._asdict() for row in session.execute(stmt)]
+
+
+def _endorsement_requests(session: Session, user_id: int) -> list:
+    stmt = (select(EndorsementRequests.request_id, EndorsementRequests.archive,
+                   EndorsementRequests.subject_class, EndorsementRequests.flag_valid,
+                   EndorsementRequests.issued_when, EndorsementRequests.point_value)
+            .where(EndorsementRequests.endorsee_id == user_id)
+            .order_by(EndorsementRequests.request_id.desc())
+            .limit(RECENT_ROWS))
+    return [row._asdict() for row in session.execute(stmt)]
+
+
+def _admin_audit(session: Session, user_id: int) -> list:
+    stmt = (select(TapirAdminAudit.entry_id, TapirAdminAudit.log_date,
+                   TapirAdminAudit.action, TapirAdminAudit.data,
+                   TapirAdminAudit.comment, TapirAdminAudit.ip_addr,
+                   TapirAdminAudit.admin_user,
+                   TapirNicknames.nickname.label('admin_nickname'))
+            .outerjoin(TapirNicknames,
+                       and_(TapirNicknames.user_id == TapirAdminAudit.admin_user,
+                            TapirNicknames.flag_primary == 1))
+            .where(TapirAdminAudit.affected_user == user_id)
+            .order_by(TapirAdminAudit.entry_id.desc())
+            .limit(RECENT_ROWS))
+    tz = current_app.config['ARXIV_BUSINESS_TZ']
+    return [dict(row._asdict(), log_date=datetime.fromtimestamp(row.log_date, tz))
+            for row in session.execute(stmt)]
+
+
+def load_user_detail(user_id: int) -> Optional[dict]:
+    """Load the data of the user page with five queries.
+
+    The counts are done by the DB, and only the most recent `RECENT_ROWS`
+    requests and audit rows are loaded, however many the user has.
+
+    Returns `None` if there is no such user.
+    """
+    # Not the replica, the data is cached and must not be from before a write
+    session = get_db(current_app).session
+    user = _profile(session, user_id)
+    if user is None:
+        return None
+    return dict(user=user,
+                nicknames=_nicknames(session, user_id),
+                ownership_requests=_ownership_requests(session, user_id),
+                endorsement_requests=_endorsement_requests(session, user_id),
+                admin_audit=_admin_audit(session, user_id))
+
+
+def user_detail(user_id: int) -> dict:
+    """Get the data of the user page, from the user cache if it is there.
+
+    See :mod:`admin_webapp.user_cache`.
+    """
+    data = get_user_cache(current_app).get(user_id,
+                                           lambda: load_user_detail(user_id))
+    if data is None:
+        abort(404)
+    return data
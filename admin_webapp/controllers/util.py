@@ -1,11 +1,40 @@
 """Helpers for :mod:`accounts.controllers`."""
-from typing import Any
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Tuple
 
 from wtforms.widgets import ListWidget, CheckboxInput, Select, \
     html_params
 from wtforms import SelectField, SelectMultipleField, Form
 from markupsafe import Markup
 
+# The choices of these fields, like all the arXiv categories, rarely change,
+# so the markup of each choice is rendered once per process and cached, keyed
+# on the choices themselves. A render then only picks the checked or selected
+# variant of each choice. Renders with arguments that can't be hashed are not
+# cached.
+
+
+@lru_cache(maxsize=64)
+def _checkbox_items(field_id: str, name: str, li_class: str,
+                    attrs: Tuple[Tuple[str, Hashable], ...],
+                    choices: Tuple[Tuple[Any, Any], ...]) -> Tuple[Tuple[str, str], ...]:
+    """Get the unchecked and checked ``li`` of each choice."""
+    items = []
+    for value, label in choices:
+        choice_id = '%s-%s' % (field_id, value)
+        options = dict(attrs, name=name, value=value, id=choice_id)
+        variants = []
+        for checked in (False, True):
+            if checked:
+                options['checked'] = 'checked'
+            variants.append(f'<li class="{li_class}">'
+                            f'<input {html_params(**options)} />'
+                            f'<label for="{choice_id}">{label}</label></li>'
+                            '</li>')
+        items.append((variants[0], variants[1]))
+    return tuple(items)
+
+
 class MultiCheckboxField(SelectMultipleField):
     """Multi-select with checkbox inputs."""
 
@@ -18,19 +47,47 @@ class MultiCheckboxField(SelectMultipleField):
         li_class = kwargs.pop('li_class')
         field_id = kwargs.pop('id', self.id)
         html = ['<ul %s>' % html_params(id=field_id, class_=ul_class)]
-        for value, label, checked in self.iter_choices():
-            choice_id = '%s-%s' % (field_id, value)
-            options = dict(kwargs, name=self.name, value=value, id=choice_id)
-            if checked:
-                options['checked'] = 'checked'
-            html.append(f'<li class="{li_class}">')
-            html.append(f'<input {html_params(**options)} />')
-            html.append(f'<label for="{choice_id}">{label}</label></li>')
-            html.append('</li>')
+        # WTForms 3.1 added render_kw to the (value, label, checked) tuples
+        choices = [choice[:3] for choice in self.iter_choices()]
+        try:
+            items = _checkbox_items(field_id, self.name, li_class,
+                                    tuple(sorted(kwargs.items())),
+                                    tuple((value, label) for value, label, _ in choices))
+        except TypeError:  # Unhashable
+            items = _checkbox_items.__wrapped__(field_id, self.name, li_class,
+                                                tuple(kwargs.items()),
+                                                tuple((value, label) for value, label, _ in choices))
+        html.extend(checked_li if checked else unchecked_li
+                    for (unchecked_li, checked_li), (_, _, checked) in zip(items, choices))
         html.append('</ul>')
         return ''.join(html)
 
 
+@lru_cache(maxsize=64)
+def _optgroup_options(widget: Select, choices: Tuple[Tuple[Any, Tuple[Tuple[Any, Any], ...]], ...]) \
+        -> Tuple[str, Dict[Any, Tuple[int, int, str]]]:
+    """Get the ``optgroup``s with nothing selected.
+
+    Also returns where each option is in them, and the option when
+    selected.
+    """
+    html = []
+    length = 0
+    selected: Dict[Any, Tuple[int, int, str]] = {}
+    for group_label, items in choices:
+        html.append('<optgroup %s>' % html_params(label=group_label))
+        length += len(html[-1])
+        for value, label in items:
+            option = str(widget.render_option(value, label, False))
+            selected.setdefault(value, (length, length + len(option),
+                                        str(widget.render_option(value, label, True))))
+            html.append(option)
+            length += len(option)
+        html.append('</optgroup>')
+        length += len(html[-1])
+    return ''.join(html), selected
+
+
 class OptGroupSelectWidget(Select):
     """Select widget with optgroups."""
 
@@ -39,16 +96,15 @@ class OptGroupSelectWidget(Select):
         kwargs.setdefault('id', field.id)
         if self.multiple:
             kwargs['multiple'] = True
-        html = [f'<select {html_params(name=field.name, **kwargs)}>']
-        html.append('<option></option>')
-        for group_label, items in field.choices:
-            html.append('<optgroup %s>' % html_params(label=group_label))
-            for value, label in items:
-                option = self.render_option(value, label, value == field.data)
-                html.append(option)
-            html.append('</optgroup>')
-        html.append('</select>')
-        return Markup(''.join(html))
+        options, selected = _optgroup_options(
+            self, tuple((group_label, tuple(items)) for group_label, items in field.choices))
+        try:
+            start, end, selected_option = selected[field.data]
+            options = options[:start] + selected_option + options[end:]
+        except (KeyError, TypeError):  # Nothing, or a list, selected
+            pass
+        return Markup(f'<select {html_params(name=field.name, **kwargs)}>'
+                      f'<option></option>{options}</select>')
 
 
 class OptGroupSelectField(SelectField):
@@ -0,0 +1,51 @@
+"""Cache for the total counts shown on admin listings.
+
+Listings like ``/ownership/pending`` show the number of matching rows, which
+costs a full ``COUNT(*)`` over the table on every request. The count only has
+to be roughly current, so it is kept for a short TTL and dropped when a
+controller changes the rows being counted.
+
+The cache is per process. Invalidation in one uwsgi worker does not reach the
+others, those see the change when their entry expires.
+"""
+
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class CountCache:
+    """TTL cache of counts keyed by the listing's filter values."""
+
+    def __init__(self) -> None:
+        self._counts: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable, ttl: float, count: Callable[[], int]) -> int:
+        """Get the count for ``key``, calling ``count`` if it is missing or stale.
+
+        Parameters
+        ----------
+        key : Hashable
+            The values that select the counted rows.
+        ttl : float
+            Seconds a cached count is good for. If 0, always call ``count``.
+        count : Callable
+            Gets the count from the database.
+        """
+        if ttl <= 0:
+            return count()
+        now = monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+        value = count()
+        with self._lock:
+            self._counts[key] = (now, value)
+        return value
+
+    def invalidate(self) -> None:
+        """Drop all cached counts, ex. after a write to the counted table."""
+        with self._lock:
+            self._counts.clear()
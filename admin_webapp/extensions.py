@@ -1,13 +1,90 @@
 """Db related functions."""
 
+import os
+from typing import Any
+
 from flask_wtf.csrf import CSRFProtect
 from flask_sqlalchemy import SQLAlchemy
 from flask import Flask
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .count_cache import CountCache
+from .taken_cache import TakenCache
+from .user_cache import UserCache
 
 def get_db(app:Flask) -> SQLAlchemy:
     """Gets the SQLAlchemy object for the flask app."""
     return app.extensions['sqlalchemy'].db
 
+def is_app_session(app:Flask, session: Session) -> bool:
+    """Check if `session` is the app's DB session of the current scope.
+
+    Session event listeners on ``get_db(app).session`` are registered on its
+    class, which all Flask-SQLAlchemy sessions share, ex. the legacy auth one.
+    """
+    registry = get_db(app).session.registry
+    return registry.has() and registry() is session
+
 def get_csrf(app:Flask) -> CSRFProtect:
     """Gets CSRF for the app"""
     return app.extensions['csrf']
+
+def get_count_cache(app:Flask) -> CountCache:
+    """Gets the listing count cache for the app."""
+    return app.extensions['count_cache']
+
+def get_taken_cache(app:Flask) -> TakenCache:
+    """Gets the cache of taken usernames and emails for the app."""
+    return app.extensions['taken_cache']
+
+def get_user_cache(app:Flask) -> UserCache:
+    """Gets the cache of user page data for the app."""
+    return app.extensions['user_cache']
+
+
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+"""Engine options that sqlite's pools don't take."""
+
+
+class SharedSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy that makes fork safe engines.
+
+    Flask-SQLAlchemy 2 keeps engines in ``app.extensions['sqlalchemy']``, so
+    the ``db`` of ``arxiv_auth.legacy``, initialized on the app before this,
+    uses the engine of this one too: one pool per worker. The factory creates
+    the engine up front so it is always made by this class.
+    """
+
+    def create_engine(self, sa_url: Any, engine_opts: dict) -> Engine:
+        """Create an engine whose connections are not used across a fork."""
+        if sa_url.drivername.startswith('sqlite'):
+            engine_opts = {key: value for key, value in engine_opts.items()
+                           if key not in QUEUE_POOL_OPTIONS}
+        engine = super().create_engine(sa_url, engine_opts)
+        event.listen(engine, 'connect', _record_pid)
+        event.listen(engine, 'checkout', _check_pid)
+        return engine
+
+
+def _record_pid(dbapi_connection, connection_record):  # type: ignore
+    connection_record.info['pid'] = os.getpid()
+
+
+def _check_pid(dbapi_connection, connection_record, connection_proxy):  # type: ignore
+    """Don't use a connection opened by the parent of a forked process."""
+    if connection_record.info['pid'] != os.getpid():
+        # Drop it without closing, the socket still belongs to the parent
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise exc.DisconnectionError(
+            f"Connection from pid {connection_record.info['pid']} used in pid {os.getpid()}")
+
+
+def dispose_after_fork(app: Flask) -> None:
+    """Drop the DB connections a forked process got from its parent.
+
+    Connections stay open for the parent.
+    """
+    with app.app_context():
+        get_db(app).engine.dispose(close=False)
@@ -7,6 +7,7 @@ from flask_s3 import FlaskS3
 from flask_bootstrap import Bootstrap5
 
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from arxiv.base import Base
 from arxiv.base.middleware import wrap
@@ -17,11 +18,17 @@ from arxiv_auth.auth.sessions import SessionStore
 from arxiv_auth.legacy.util import init_app as legacy_init_app
 from arxiv_auth.legacy.util import create_all as legacy_create_all
 
-from flask_sqlalchemy import SQLAlchemy
-
 import arxiv_db
 
 from .routes import ui, ownership, endorsement, user, paper
+from .controllers import authentication
+from .count_cache import CountCache
+from .taken_cache import TakenCache
+from .extensions import SharedSQLAlchemy, get_db
+from .outbox import Outbox
+from . import timing, query_stats, replica, rate_limit, \
+    admin_log, user_cache
+from .startup import warm_up
 
 s3 = FlaskS3()
 
@@ -77,7 +84,25 @@ def create_web_app() -> Flask:
     SessionStore.init_app(app)
     legacy_init_app(app)
 
-    SQLAlchemy(app, metadata=arxiv_db.Base.metadata)
+    SharedSQLAlchemy(app, metadata=arxiv_db.Base.metadata)
+    with app.app_context():
+        get_db(app).engine  # pylint: disable=expression-not-assigned
+    replica.init_app(app)
+    admin_log.init_app(app)
+    user_cache.init_app(app)
+    app.extensions['count_cache'] = CountCache()
+    app.extensions['taken_cache'] = TakenCache(
+        app.config['REGISTRATION_TAKEN_CACHE_TTL'],
+        app.config['REGISTRATION_TAKEN_CACHE_SIZE'])
+    query_stats.init_app(app)
+    rate_limit.init_app(app)
+    if app.config['LOGOUT_OUTBOX_PATH']:
+        outbox = Outbox(app, 'logout', app.config['LOGOUT_OUTBOX_PATH'],
+                        authentication.invalidate_legacy_session,
+                        retry_delay=app.config['LOGOUT_OUTBOX_RETRY_DELAY'],
+                        max_attempts=app.config['LOGOUT_OUTBOX_MAX_ATTEMPTS'])
+        outbox.start()  # Drains what was left by a previous worker
+        app.extensions['logout_outbox'] = outbox
 
     app.register_blueprint(ui.blueprint)
     app.register_blueprint(ownership.blueprint)
@@ -93,7 +118,10 @@ def create_web_app() -> Flask:
     [csrf.exempt(view.strip())
      for view in app.config['WTF_CSRF_EXEMPT'].split(',')]
 
+    timing.init_app(app)
+
     wrap(app, [AuthMiddleware])
+    trust_proxies(app)
 
     settup_warnings(app)
 
@@ -102,9 +130,23 @@ def create_web_app() -> Flask:
             print("About to create the legacy DB")
             legacy_create_all()
 
+    if app.config['WARM_UP']:
+        warm_up(app)
+
     return app
 
 
+def trust_proxies(app: Flask) -> None:
+    """Take the client address from the ``TRUSTED_PROXY_HOPS`` proxies.
+
+    Wraps the WSGI app outermost, so the middlewares and the views, ex. the
+    rate limits and audit logs, see the client and not the load balancer.
+    """
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops)  # type: ignore
+
+
 def settup_warnings(app):
     if not app.config['SQLALCHEMY_DATABASE_URI'] and not app.config['DEBUG']:
         logger.error("SQLALCHEMY_DATABASE_URI is not set!")
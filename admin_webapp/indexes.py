@@ -0,0 +1,75 @@
+"""Indexes for the admin searches, beyond those of the legacy schema.
+
+The tables belong to the legacy DB and are defined in ``arxiv_db``, so the
+indexes the admin app needs are kept here and created with
+:func:`create_indexes`, which skips those that already exist. The deploy runs
+it before it rolls out a new image, see ``deploy/migrate.sh``::
+
+    python -m admin_webapp.indexes [mysql://...]
+
+Without a URI it uses ``SQLALCHEMY_DATABASE_URI`` or ``CLASSIC_DATABASE_URI``.
+The indexes are on copies of the tables, so importing this doesn't add them
+to the ``arxiv_db`` metadata, which other apps use to create their tables.
+
+The filters of the ownership queue also use these existing indexes:
+``user_id`` of ``arXiv_ownership_requests``, ``nickname`` of
+``tapir_nicknames``, ``email`` of ``tapir_users``, ``paper_id`` of
+``arXiv_documents`` and ``document_id`` of ``arXiv_ownership_requests_papers``.
+"""
+
+import os
+import sys
+from typing import List
+
+from sqlalchemy import Index, MetaData, create_engine, inspect
+from sqlalchemy.engine import Engine
+
+from arxiv_db.models import OwnershipRequests, OwnershipRequestsAudit
+
+_metadata = MetaData()
+_requests = OwnershipRequests.__table__.to_metadata(_metadata)
+_audit = OwnershipRequestsAudit.__table__.to_metadata(_metadata)
+
+INDEXES = [
+    # A status listing in request ID order, and keyset pages of it
+    Index('ownership_requests_status_request_id',
+          _requests.c.workflow_status, _requests.c.request_id),
+    # The requests of a user with a status
+    Index('ownership_requests_user_id_status',
+          _requests.c.user_id, _requests.c.workflow_status),
+    # The requests from an address, in a date range
+    Index('ownership_requests_audit_remote_addr_date',
+          _audit.c.remote_addr, _audit.c.date),
+    # The requests in a date range
+    Index('ownership_requests_audit_date', _audit.c.date),
+]
+"""Indexes created by :func:`create_indexes`."""
+
+
+def create_indexes(engine: Engine) -> List[str]:
+    """Create the indexes of :data:`INDEXES` that don't exist yet.
+
+    Returns
+    -------
+    list
+        The names of the indexes created.
+    """
+    created = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for index in INDEXES:
+            existing = {idx['name'] for idx in inspector.get_indexes(index.table.name)}
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    return created
+
+
+if __name__ == '__main__':
+    uri = sys.argv[1] if len(sys.argv) > 1 else \
+        os.environ.get('SQLALCHEMY_DATABASE_URI',
+                       os.environ.get('CLASSIC_DATABASE_URI'))
+    if not uri:
+        sys.exit('Pass a DB URI, or set SQLALCHEMY_DATABASE_URI')
+    for name in create_indexes(create_engine(uri)):
+        print(f'Created {name}')
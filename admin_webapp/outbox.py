@@ -0,0 +1,185 @@
+"""Durable queue of work done after the response, with retries.
+
+An :class:`Outbox` keeps its items in a SQLite file on local disk, so they
+survive a restart of the worker. A background thread per process hands each
+item to the outbox's handler in an app context. If the handler raises, the
+item is tried again later with exponential backoff, up to ``max_attempts``
+times.
+
+All the worker processes of a node can share the file. An item is claimed
+for ``LEASE_SECONDS`` before it is handled, so only one worker handles it,
+and an item claimed by a worker that died is handled again after the lease.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from time import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from flask import Flask
+
+from arxiv.base import logging
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60
+"""Seconds an item is claimed for by the worker handling it."""
+
+BATCH_SIZE = 20
+"""Most items claimed at once."""
+
+
+class Outbox:
+    """Queue of string items handled in the background."""
+
+    def __init__(self, app: Flask, name: str, path: str,
+                 handle: Callable[[str], None], retry_delay: float = 1.0,
+                 max_attempts: int = 10, poll_seconds: float = 5.0) -> None:
+        """Open or create the outbox.
+
+        Parameters
+        ----------
+        app : Flask
+            The handler is called in a context of this app.
+        name : str
+            For the logs and the metrics.
+        path : str
+            The SQLite file.
+        handle : Callable
+            Handles an item. If it raises the item is tried again.
+        retry_delay : float
+            Seconds before the first retry, it doubles for each after that.
+        max_attempts : int
+            An item that fails this many times is dropped.
+        poll_seconds : float
+            Seconds between looks for items to retry or left by other workers.
+        """
+        self.app = app
+        self.name = name
+        self.path = path
+        self.handle = handle
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._thread: Optional[Thread] = None
+        self._thread_lock = Lock()
+        self._wake = Event()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')  # Readers don't wait
+            conn.execute('CREATE TABLE IF NOT EXISTS outbox ('
+                         ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                         ' item TEXT NOT NULL,'
+                         ' enqueued REAL NOT NULL,'
+                         ' attempts INTEGER NOT NULL DEFAULT 0,'
+                         ' next_try REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS outbox_next_try'
+                         ' ON outbox (next_try)')
+        timing.METRICS.gauge(f'{name}_outbox_depth', lambda: self.depth()[0])
+        timing.METRICS.gauge(f'{name}_outbox_lag_seconds', lambda: self.depth()[1])
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit, transactions are begun explicitly
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def put(self, item: str) -> None:
+        """Add an item, and make sure this process is handling items."""
+        now = time()
+        with self._connect() as conn:
+            conn.execute('INSERT INTO outbox (item, enqueued, next_try)'
+                         ' VALUES (?, ?, ?)', (item, now, now))
+        self.start()
+        self._wake.set()
+
+    def depth(self) -> Tuple[int, float]:
+        """Get the number of items, and the seconds the oldest has waited."""
+        with self._connect() as conn:
+            count, oldest = conn.execute(
+                'SELECT COUNT(*), MIN(enqueued) FROM outbox').fetchone()
+        return count, 0.0 if oldest is None else time() - oldest
+
+    def _claim(self) -> List[Tuple[int, str, float, int]]:
+        now = time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')  # Other workers wait to claim
+            rows = conn.execute('SELECT id, item, enqueued, attempts FROM outbox'
+                                ' WHERE next_try <= ? ORDER BY id LIMIT ?',
+                                (now, BATCH_SIZE)).fetchall()
+            conn.executemany('UPDATE outbox SET next_try = ? WHERE id = ?',
+                             [(now + LEASE_SECONDS, row[0]) for row in rows])
+            conn.execute('COMMIT')
+        return rows
+
+    def drain(self) -> int:
+        """Handle the items that are due.
+
+        Returns
+        -------
+        int
+            The number of items tried.
+        """
+        rows = self._claim()
+        for item_id, item, enqueued, attempts in rows:
+            try:
+                with self.app.app_context():
+                    self.handle(item)
+            except Exception as e:  # pylint: disable=broad-except
+                self._failed(item_id, enqueued, attempts + 1, e)
+            else:
+                self._done(item_id, enqueued)
+        return len(rows)
+
+    def _done(self, item_id: int, enqueued: float) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM outbox WHERE id = ?', (item_id,))
+        self._observe(enqueued, failed=False)
+
+    def _failed(self, item_id: int, enqueued: float, attempts: int,
+                error: Exception) -> None:
+        with self._connect() as conn:
+            if attempts >= self.max_attempts:
+                logger.error('%s outbox dropped item %d after %d attempts: %s',
+                             self.name, item_id, attempts, error)
+                conn.execute('DELETE FROM outbox WHERE id = ?', (item_id,))
+                self._observe(enqueued, failed=True)
+                return
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            logger.warning('%s outbox item %d failed, retry in %.1fs: %s',
+                           self.name, item_id, delay, error)
+            conn.execute('UPDATE outbox SET attempts = ?, next_try = ?'
+                         ' WHERE id = ?', (attempts, time() + delay, item_id))
+
+    def _observe(self, enqueued: float, failed: bool) -> None:
+        if self.app.config['TIMING_METRICS']:
+            timing.METRICS.observe(f'{self.name}_outbox_drain',
+                                   time() - enqueued, failed)
+
+    def start(self) -> None:
+        """Start the background thread of this process, if it isn't running.
+
+        A forked process doesn't have the thread of its parent, so this
+        starts one for it.
+        """
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, daemon=True,
+                                      name=f'{self.name}-outbox')
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                tried = self.drain()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error('%s outbox drain failed: %s', self.name, e)
+                tried = 0
+            if not tried:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
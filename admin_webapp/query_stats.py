@@ -0,0 +1,153 @@
+"""Counts of the SQL statements of each request.
+
+With ``SQL_QUERY_STATS`` set, every statement run on any engine, including
+the legacy auth one, is counted and timed in the app context that ran it,
+from the start of the request if there is one. After each request:
+
+- statements slower than ``SQL_SLOW_QUERY_SECONDS`` have been logged with the
+  view endpoint,
+- a statement run more than ``SQL_N_PLUS_ONE_THRESHOLD`` times is logged as a
+  possible N+1,
+- a view that ran more statements itself than its :func:`query_budget` is
+  logged, or fails with :class:`QueryBudgetExceeded` if
+  ``SQL_QUERY_BUDGET_RAISE`` is set as it is in tests.
+"""
+
+from collections import Counter
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Optional, TypeVar
+
+from flask import Flask, Response, current_app, g, has_app_context, \
+    has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from arxiv.base import logging
+
+logger = logging.getLogger(__name__)
+
+View = TypeVar('View', bound=Callable[..., Any])
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more SQL statements than its budget."""
+
+
+class QueryStats:
+    """Statements run in one app context."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def add(self, statement: str, seconds: float) -> None:
+        """Record a statement that took `seconds`."""
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+
+def current() -> Optional[QueryStats]:
+    """Get the stats of the current app context, if any."""
+    if not has_app_context():
+        return None
+    if 'query_stats' not in g:
+        g.query_stats = QueryStats()
+    return g.query_stats  # type: ignore
+
+
+def query_budget(max_queries: int) -> Callable[[View], View]:
+    """Set how many SQL statements the view may run.
+
+    Only the statements of the view count, not those of the before_request
+    functions such as the legacy auth session lookup, which vary by user.
+    Use under the route decorator.
+    """
+    def decorator(view: View) -> View:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            stats = g.get('query_stats')
+            g.query_budget_start = stats.count if stats else 0
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries  # type: ignore
+        return wrapper  # type: ignore
+    return decorator
+
+
+def _endpoint() -> Optional[str]:
+    return request.endpoint if has_request_context() else None
+
+
+def _enabled() -> bool:
+    return has_app_context() and current_app.config['SQL_QUERY_STATS']
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # type: ignore
+    if _enabled():
+        conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # type: ignore
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    seconds = perf_counter() - starts.pop()
+    current().add(statement, seconds)  # type: ignore
+    if seconds >= current_app.config['SQL_SLOW_QUERY_SECONDS']:
+        logger.warning('Slow query %.3fs in %s: %s', seconds, _endpoint(), statement)
+
+
+def _handle_error(context):  # type: ignore
+    starts = context.connection.info.get('query_start') if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _start_request() -> None:
+    # A request can share its app context, ex. with the one a test pushed
+    g.pop('query_stats', None)
+    g.pop('query_budget_start', None)
+
+
+def _check_request(response: Response) -> Response:
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    endpoint = _endpoint()
+    logger.debug('%d queries in %.3fs in %s', stats.count, stats.seconds, endpoint)
+    threshold = current_app.config['SQL_N_PLUS_ONE_THRESHOLD']
+    for statement, count in stats.statements.most_common():
+        if count <= threshold:
+            break
+        logger.warning('Possible N+1 in %s, %d times: %s', endpoint, count, statement)
+
+    view = current_app.view_functions.get(endpoint) if endpoint else None
+    budget = getattr(view, 'query_budget', None)
+    spent = stats.count - g.get('query_budget_start', 0)
+    if budget is not None and spent > budget:
+        message = f'{endpoint} ran {spent} queries, its budget is {budget}'
+        if current_app.config['SQL_QUERY_BUDGET_RAISE']:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+_listening = False
+_listening_lock = Lock()
+
+
+def init_app(app: Flask) -> None:
+    """Count statements while ``SQL_QUERY_STATS`` is set."""
+    global _listening
+    with _listening_lock:
+        if not _listening:  # The listeners are for all engines of all apps
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            _listening = True
+    # First, so the statements of the other before_request functions count
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request)
+    app.after_request(_check_request)
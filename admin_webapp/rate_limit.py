@@ -0,0 +1,174 @@
+"""Per client IP rate limits on views that are costly to abuse.
+
+Logins verify a password hash, registrations query the DB and captchas
+render an image, so a burst of requests to them can saturate a worker. Views
+decorated with :func:`rate_limit` take a token from a bucket for the client
+IP before the view runs. A client with an empty bucket gets a plain 429 with
+``Retry-After``, without any form parsing or DB work.
+
+Each limit is configured as ``"N/S"``: a bucket holds ``N`` tokens and
+refills at ``N`` tokens every ``S`` seconds. With ``RATE_LIMIT_BACKEND`` set
+to ``local`` the buckets are per process, with ``redis`` they are shared by
+all workers in the Redis of the ``REDIS_*`` config. If Redis can't be
+reached, requests are let through.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from math import ceil
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Callable, Optional, Sequence, Tuple, TypeVar
+
+from flask import Flask, Response, current_app, request
+
+from arxiv import status
+from arxiv.base import logging
+from arxiv_auth.auth.sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+View = TypeVar('View', bound=Callable[..., Any])
+
+
+def parse_limit(limit: str) -> Tuple[int, float]:
+    """Parse a ``"N/S"`` limit to the bucket size and tokens per second."""
+    tokens, seconds = limit.split('/')
+    capacity = int(tokens)
+    return capacity, capacity / float(seconds)
+
+
+class LocalBuckets:
+    """Token buckets in this process.
+
+    At most ``max_keys`` buckets are kept, the least recently used are
+    dropped first. A dropped bucket starts out full again.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = Lock()
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take a token from the bucket for ``key``.
+
+        Returns
+        -------
+        float
+            0 if a token was taken, otherwise the seconds until there is one.
+        """
+        now = monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        """Refill all buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+"""Take a token atomically. The bucket expires once it would be full."""
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by all workers."""
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._take: Optional[Any] = None
+        self._lock = Lock()
+
+    def _script(self) -> Any:
+        # The client is made on first use, a Redis cluster client connects
+        # when it is made.
+        with self._lock:
+            if self._take is None:
+                redis = SessionStore.get_session(self.app).r
+                self._take = redis.register_script(TAKE_SCRIPT)
+            return self._take
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take a token from the bucket for ``key``, see :meth:`LocalBuckets.take`."""
+        try:
+            wait = self._script()(keys=[f'rate_limit:{key}'],
+                                  args=[capacity, rate, time()])
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning('Rate limit not checked, Redis failed: %s', exc)
+            return 0.0
+        return float(wait)
+
+
+def rate_limit(name: str, methods: Optional[Sequence[str]] = None) \
+        -> Callable[[View], View]:
+    """Limit the requests per client IP to the view.
+
+    Use under the route decorator.
+
+    Parameters
+    ----------
+    name : str
+        The limit is ``RATE_LIMIT_<NAME>`` in the config.
+    methods : list
+        The HTTP methods to limit, all if `None`.
+    """
+    def decorator(view: View) -> View:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            config = current_app.config
+            if not config['RATE_LIMIT'] \
+                    or (methods is not None and request.method not in methods):
+                return view(*args, **kwargs)
+            capacity, rate = parse_limit(config[f'RATE_LIMIT_{name.upper()}'])
+            buckets = current_app.extensions['rate_limit']
+            wait = buckets.take(f'{name}:{request.remote_addr}', capacity, rate)
+            if wait > 0:
+                logger.info('Rate limited %s from %s', name, request.remote_addr)
+                return Response('Too many requests',
+                                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                                mimetype='text/plain',
+                                headers={'Retry-After': str(ceil(wait))})
+            return view(*args, **kwargs)
+        return wrapper  # type: ignore
+    return decorator
+
+
+def init_app(app: Flask) -> None:
+    """Set up the buckets of ``RATE_LIMIT_BACKEND``."""
+    backend = app.config['RATE_LIMIT_BACKEND']
+    if backend == 'redis':
+        app.extensions['rate_limit'] = RedisBuckets(app)
+    elif backend == 'local':
+        app.extensions['rate_limit'] = LocalBuckets(
+            app.config['RATE_LIMIT_LOCAL_MAX_KEYS'])
+    else:
+        raise ValueError(f'Unknown RATE_LIMIT_BACKEND {backend}')
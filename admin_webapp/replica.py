@@ -0,0 +1,106 @@
+"""Routing of read only queries to a DB replica.
+
+With ``SQLALCHEMY_REPLICA_DATABASE_URI`` set, :func:`read_session` returns a
+session on the replica. Views that only read use it, everything that writes,
+and reads that must see a write just made, use ``get_db(app).session`` on the
+primary.
+
+The replica is only used while its replication lag is at most
+``DB_REPLICA_MAX_LAG`` seconds. The lag is checked at most once every
+``DB_REPLICA_CHECK_TTL`` seconds per process. If the replica is lagging or
+can't be reached, reads go to the primary.
+"""
+
+from threading import Lock
+from time import monotonic
+from typing import Optional
+
+from flask import Flask, current_app
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+
+from arxiv.base import logging
+
+from .extensions import get_db
+
+logger = logging.getLogger(__name__)
+
+
+def replication_lag(conn: Connection) -> Optional[float]:
+    """Get the seconds the replica is behind its source.
+
+    Returns `None` if replication is not running. A DB that is not a MySQL
+    replica has no lag.
+    """
+    if conn.dialect.name != 'mysql':
+        return 0.0
+    try:
+        row = conn.execute(text('SHOW REPLICA STATUS')).mappings().first()
+        key = 'Seconds_Behind_Source'
+    except Exception:  # pylint: disable=broad-except
+        # Before MySQL 8.0.22
+        row = conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+        key = 'Seconds_Behind_Master'
+    if row is None:
+        return 0.0
+    lag = row[key]
+    return None if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    """Hands out replica sessions while the replica is up to date."""
+
+    def __init__(self, app: Flask, engine: Engine) -> None:
+        self.engine = engine
+        # Not a Flask-SQLAlchemy session, its binds send every table of the
+        # app's metadata to the primary engine, whatever its own bind is
+        self.session = scoped_session(sessionmaker(bind=engine))
+        self._lock = Lock()
+        self._checked_at: Optional[float] = None
+        self._usable = False
+        app.teardown_appcontext(lambda exc: self.session.remove())
+
+    def usable(self) -> bool:
+        """Check, or get the last check of, whether the replica can be used."""
+        ttl = current_app.config['DB_REPLICA_CHECK_TTL']
+        with self._lock:
+            if self._checked_at is None or monotonic() - self._checked_at >= ttl:
+                self._usable = self._check()
+                self._checked_at = monotonic()
+            return self._usable
+
+    def _check(self) -> bool:
+        max_lag = current_app.config['DB_REPLICA_MAX_LAG']
+        try:
+            with self.engine.connect() as conn:
+                lag = replication_lag(conn)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning('Replica unavailable, reading from the primary: %s', exc)
+            return False
+        if lag is None or lag > max_lag:
+            logger.warning('Replica lag is %s seconds, reading from the primary', lag)
+            return False
+        return True
+
+
+def init_app(app: Flask) -> None:
+    """Set up the replica, if ``SQLALCHEMY_REPLICA_DATABASE_URI`` is set."""
+    uri = app.config['SQLALCHEMY_REPLICA_DATABASE_URI']
+    if not uri:
+        return
+    engine = get_db(app).create_engine(make_url(uri),
+                                       dict(app.config['SQLALCHEMY_ENGINE_OPTIONS']))
+    app.extensions['replica'] = ReplicaRouter(app, engine)
+
+
+def read_session(app: Flask) -> Session:
+    """Get a session for read only queries.
+
+    This is on the replica if there is one and it is up to date, otherwise
+    it is the primary session.
+    """
+    router: Optional[ReplicaRouter] = app.extensions.get('replica')
+    if router is not None and router.usable():
+        return router.session  # type: ignore
+    return get_db(app).session  # type: ignore
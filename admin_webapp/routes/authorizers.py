@@ -0,0 +1,11 @@
+"""Authorizers for :func:`arxiv_auth.auth.decorators.scoped` on admin routes."""
+
+from typing import Any
+
+EDIT_USERS_CAPABILITY = 2
+"""Bit of the classic capabilities of a session for tapir's flag_edit_users."""
+
+
+def can_edit_users(session: Any, *args: Any, **kwargs: Any) -> bool:
+    """Check a user without the global scope is a tapir user admin."""
+    return bool(session.authorizations.classic & EDIT_USERS_CAPABILITY)
@@ -1,16 +1,62 @@
 """arXiv paper ownership routes."""
 
+from datetime import datetime
+from typing import Any, Dict, Optional
+
 from flask import Blueprint, render_template, request, \
-    Response
+    Response, current_app, stream_with_context
+from werkzeug.exceptions import BadRequest
+
+from arxiv_auth.auth import scopes
+from arxiv_auth.auth.decorators import scoped
 
+from admin_webapp.query_stats import query_budget
+from admin_webapp.routes.authorizers import can_edit_users
 from admin_webapp.controllers.ownership import ownership_detail, \
-    ownership_listing, ownership_post
+    ownership_listing, ownership_post, ownership_bulk_post, ownership_export, \
+    OWNERSHIP_FILTERS
 
 
 blueprint = Blueprint('ownership', __name__, url_prefix='/ownership')
 
 
+def _cursor() -> Optional[str]:
+    """Get the keyset pagination cursor, or `None` to use page numbers."""
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is None and current_app.config['OWNERSHIP_KEYSET_PAGINATION']:
+        return ''
+    return cursor
+
+
+def _date_arg(name: str) -> Optional[datetime]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise BadRequest(f'{name} must be an ISO date') from e
+
+
+def _filters() -> Dict[str, Any]:
+    """Get the filters of an ownership listing from the query."""
+    return dict(user_id=request.args.get('user_id', default=None, type=int),
+                nickname=request.args.get('nickname', '').strip(),
+                email=request.args.get('email', '').strip(),
+                paper_id=request.args.get('paper_id', '').strip(),
+                remote_addr=request.args.get('remote_addr', '').strip(),
+                since=_date_arg('since'),
+                until=_date_arg('until'))
+
+
+def _filter_args() -> Dict[str, str]:
+    """The filters in the query, to keep them in the listing's links."""
+    return {key: request.args[key] for key in OWNERSHIP_FILTERS
+            if request.args.get(key)}
+
+
 @blueprint.route('/<int:ownership_id>', methods=['GET', 'POST'])
+@query_budget(16)  # A POST loads the request again after it commits
 def display(ownership_id:int) -> Response:
     if request.method == 'GET':
         return render_template('ownership/display.html',**ownership_detail(ownership_id, None))
@@ -18,19 +64,39 @@ def display(ownership_id:int) -> Response:
         return render_template('ownership/display.html', **ownership_detail(ownership_id, ownership_post))
 
 
-@blueprint.route('/pending', methods=['GET'])
+@scoped(scopes.EDIT_PROFILE, authorizer=can_edit_users)
+def _bulk_accept() -> Dict[str, Any]:
+    """Accept the checked requests, this makes users owners of papers."""
+    request_ids = request.form.getlist('request_id', type=int)
+    is_author = 1 if request.form.get('is_author') == '1' else 0
+    return ownership_bulk_post(request_ids, is_author)
+
+
+@blueprint.route('/pending', methods=['GET', 'POST'])
+@query_budget(14)
 def pending() -> Response:
-    """Pending ownership requests."""
+    """Pending ownership requests.
+
+    A POST accepts all the checked requests in bulk, for admins only.
+    """
     args = request.args
     per_page = args.get('per_page', default=12, type=int)
     page = args.get('page', default=1, type=int)
-    data = ownership_listing('pending', per_page, page, 0)
+    success = {}
+    if request.method == 'POST':
+        success = _bulk_accept()
+    data = ownership_listing('pending', per_page, page, 0, cursor=_cursor(),
+                             use_primary=request.method == 'POST',
+                             filters=_filters())
+    data.update(success)
+    data['filter_args'] = _filter_args()
     data['title'] = "Ownership Reqeusts: Pending"
     return render_template('ownership/list.html',
                            **data)
 
 
 @blueprint.route('/accepted', methods=['GET'])
+@query_budget(12)
 def accepted() -> Response:
     """Accepted ownership requests."""
     args = request.args
@@ -38,13 +104,16 @@ def accepted() -> Response:
     page = args.get('page', default=1, type=int)
     days_back = args.get('days_back', default=7, type=int)
 
-    data = ownership_listing('accepted', per_page, page, days_back=days_back)
+    data = ownership_listing('accepted', per_page, page, days_back=days_back,
+                             cursor=_cursor(), filters=_filters())
+    data['filter_args'] = _filter_args()
     data['title'] = f"Ownership Reqeusts: accepted last {days_back} days"
     return render_template('ownership/list.html',
                            **data)
 
 
 @blueprint.route('/rejected', methods=['GET'])
+@query_budget(12)
 def rejected() -> Response:
     """Rejected ownership reqeusts."""
     args = request.args
@@ -52,7 +121,37 @@ def rejected() -> Response:
     page = args.get('page', default=1, type=int)
     days_back = args.get('days_back', default=7, type=int)
 
-    data = ownership_listing('rejected', per_page, page, days_back=days_back)
+    data = ownership_listing('rejected', per_page, page, days_back=days_back,
+                             cursor=_cursor(), filters=_filters())
+    data['filter_args'] = _filter_args()
     data['title'] = f"Ownership Reqeusts: Rejected last {days_back} days"
     return render_template('ownership/list.html',
                            **data)
+
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+@blueprint.route('/export', methods=['GET'])
+@scoped(scopes.VIEW_PROFILE, authorizer=can_edit_users)
+def export() -> Response:
+    """Stream ownership requests as CSV or JSON Lines, for reports.
+
+    The optional query parameters are ``format``, ``csv`` by default or
+    ``jsonl``, the workflow ``status``, and ``since`` and ``until`` ISO dates
+    of the requests.
+
+    The export has the emails of the users, so it is for admins only: the
+    global ``profile:read:*`` scope, or flag_edit_users for legacy admins.
+    """
+    export_format = request.args.get('format', 'csv')
+    workflow_status = request.args.get('status') or None
+    if export_format not in EXPORT_MIMETYPES:
+        raise BadRequest('format must be csv or jsonl')
+    if workflow_status not in (None, 'pending', 'accepted', 'rejected'):
+        raise BadRequest('status must be pending, accepted or rejected')
+    chunks = ownership_export(export_format, workflow_status,
+                              _date_arg('since'), _date_arg('until'))
+    return Response(stream_with_context(chunks),
+                    mimetype=EXPORT_MIMETYPES[export_format],
+                    headers={'Content-Disposition':
+                             f'attachment; filename=ownership_requests.{export_format}'})
@@ -4,14 +4,16 @@ from typing import Any, Callable
 from datetime import timedelta, datetime
 from functools import wraps
 from flask import Blueprint, render_template, url_for, request, \
-    make_response, redirect, current_app, send_file, Response
+    make_response, redirect, current_app, send_file, Response, jsonify
 
 from arxiv import status
 from arxiv.base import logging
 
 from arxiv_auth.auth.decorators import scoped
 
-from ..controllers import captcha_image, registration, authentication
+from .. import timing
+from ..rate_limit import rate_limit
+from ..controllers import captcha_image, registration, authentication, health
 
 
 logger = logging.getLogger(__name__)
@@ -101,6 +103,7 @@ def apply_response_headers(response: Response) -> Response:
     return response
 
 @blueprint.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', methods=['POST'])
 @anonymous_only
 def register() -> Response:
     """Interface for creating new accounts."""
@@ -122,7 +125,16 @@ def register() -> Response:
     return response
 
 
+@blueprint.route('/register/available', methods=['GET'])
+@rate_limit('register_available')
+def register_available() -> Response:
+    """Live check of the ``username`` and ``email`` on the registration form."""
+    data, code, headers = registration.availability(request.args)
+    return jsonify(data), code, headers
+
+
 @blueprint.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', methods=['POST'])
 @anonymous_only
 def login() -> Response:
     """User can log in with username and password, or permanent token."""
@@ -178,6 +190,7 @@ def logout() -> Response:
 
 
 @blueprint.route('/captcha', methods=['GET'])
+@rate_limit('captcha')
 def captcha() -> Response:
     """Provide the image for stateless captcha."""
     secret = current_app.config['CAPTCHA_SECRET']
@@ -193,6 +206,30 @@ def auth_status() -> Response:
     return make_response("OK")
 
 
+@blueprint.route('/health/live')
+def live() -> Response:
+    """Get if the app is running, without touching the DB or Redis.
+
+    This is for the load balancer health check.
+    """
+    return Response("OK", mimetype='text/plain')
+
+
+@blueprint.route('/health/ready')
+def ready() -> Response:
+    """Get if the DB and Redis can be used, with the latency of each."""
+    data, code, headers = health.readiness()
+    return jsonify(data), code, headers
+
+
+@blueprint.route('/metrics')
+def metrics() -> Response:
+    """Get the timing histograms of this process, if TIMING_METRICS is set."""
+    if not current_app.config['TIMING_METRICS']:
+        return make_response("Not Found", status.HTTP_404_NOT_FOUND)
+    return Response(timing.METRICS.exposition(), mimetype='text/plain; version=0.0.4')
+
+
 @blueprint.route('/protected')
 @scoped()
 def an_example() -> Response:
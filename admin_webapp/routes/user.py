@@ -2,11 +2,20 @@
 
 from flask import Blueprint, render_template, Response
 
+from arxiv_auth.auth import scopes
+from arxiv_auth.auth.decorators import scoped
+
+from admin_webapp.query_stats import query_budget
+from admin_webapp.routes.authorizers import can_edit_users
+from admin_webapp.controllers.user import user_detail
+
 
 blueprint = Blueprint('user', __name__, url_prefix='/user')
 
 
-@blueprint.route('/<int:id>', methods=['GET'])
-def display() -> Response:
-    """Display a user."""
-    return render_template('user/display.html')
+@blueprint.route('/<int:user_id>', methods=['GET'])
+@scoped(scopes.VIEW_PROFILE, authorizer=can_edit_users)
+@query_budget(6)
+def display(user_id: int) -> Response:
+    """Display a user, for admins only."""
+    return render_template('user/display.html', **user_detail(user_id))
@@ -0,0 +1,109 @@
+"""Application warm-up and import-time report.
+
+:func:`warm_up` does the work that would otherwise fall on the first
+requests after a deploy: compiling the Jinja templates, opening a DB and a
+Redis connection and loading the taxonomy. It is run by
+:func:`admin_webapp.factory.create_web_app` when ``WARM_UP`` is set.
+
+Run this module to get a report of the slowest imports of the app::
+
+    python -m admin_webapp.startup
+"""
+
+import re
+import subprocess
+import sys
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from flask import Flask
+from sqlalchemy import text
+
+from arxiv.base import logging
+
+from .controllers import registration
+from .controllers.health import check_redis
+from .extensions import get_db
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app: Flask) -> Dict[str, float]:
+    """Prepare `app` to serve its first requests quickly.
+
+    A step that fails is logged and skipped, a missing DB or Redis should not
+    stop the app from starting.
+
+    Returns
+    -------
+    dict
+        Seconds taken by each warm-up step.
+    """
+    timings = {}
+    for name, step in [('templates', _compile_templates),
+                       ('db', _connect_db),
+                       ('redis', _connect_redis),
+                       ('taxonomy', _load_taxonomy)]:
+        start = perf_counter()
+        try:
+            with app.app_context():
+                step(app)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Warm up step %s failed', name)
+        timings[name] = perf_counter() - start
+    logger.info('Warm up took %s', ', '.join(f'{name} {secs * 1000:.0f}ms'
+                                            for name, secs in timings.items()))
+    return timings
+
+
+def _compile_templates(app: Flask) -> None:
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def _connect_db(app: Flask) -> None:
+    """Leave an open connection in the pool."""
+    get_db(app).session.execute(text('SELECT 1'))
+    get_db(app).session.remove()
+
+
+def _connect_redis(app: Flask) -> None:
+    check_redis()
+
+
+def _load_taxonomy(app: Flask) -> None:
+    """Build the taxonomy choices of the profile form."""
+    registration.group_choices()
+    registration.category_choices()
+
+
+IMPORT_TIME = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_times(module: str = 'admin_webapp.factory') -> List[Tuple[int, int, str]]:
+    """Get how long each import takes when importing `module`.
+
+    This imports `module` in a new interpreter with ``-X importtime``.
+
+    Returns
+    -------
+    list
+        Tuples of self and cumulative microseconds and the module name for
+        every top level import, slowest cumulative time first. `module`
+        itself is one of these with the time of all its imports.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, check=True)
+    times = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match and len(match.group(3)) == 1:  # Not nested under another import
+            times.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return sorted(times, key=lambda item: item[1], reverse=True)
+
+
+if __name__ == '__main__':
+    MODULE = sys.argv[1] if len(sys.argv) > 1 else 'admin_webapp.factory'
+    print(f'{"self ms":>9} {"cumulative ms":>14}  module')
+    for self_us, cumulative_us, name in import_times(MODULE)[:25]:
+        print(f'{self_us / 1000:9.1f} {cumulative_us / 1000:14.1f}  {name}')
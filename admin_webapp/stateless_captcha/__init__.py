@@ -11,6 +11,10 @@ encrypted using a server-side secret and the IP address of the client.
 The captcha token can be used to generate an image that depicts the captcha
 challenge, using the :func:`.render` function in this module.
 
+The token is a JWT with the standard numeric ``exp`` claim. Tokens from
+before that (v1) had an ISO-8601 ``expires`` claim instead, these are still
+accepted until they expire.
+
 When the user enters an answer to the challenge, the answer can be checked
 against the token using the :func:`.check` function. If the token is expired,
 or cannot be decrypted for some reason (e.g. forgery, change of IP address),
@@ -24,10 +28,15 @@ for use elsewhere.
 
 import random
 import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
 from typing import Any, Mapping, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
+from time import time
 from pytz import timezone, UTC
-import dateutil.parser
 import string
 import jwt
 from captcha.image import ImageCaptcha
@@ -37,6 +46,12 @@ from arxiv.base import logging
 EASTERN = timezone('US/Eastern')
 logger = logging.getLogger(__name__)
 
+RENDER_CACHE_SIZE = 128
+"""Number of rendered captcha images to keep per process."""
+
+RENDER_START_TIMEOUT = 30
+"""Seconds for all the processes of the render pool to start."""
+
 
 class InvalidCaptchaToken(ValueError):
     """A token was passed that is either expired or corrupted."""
@@ -97,20 +112,25 @@ def unpack(token: str, secret: str, ip_address: str) -> str:
     """
     logger.debug('Unpack captcha token, %s', token)
     try:
+        # PyJWT checks the exp claim of v2 tokens
         claims: Mapping[str, Any] = jwt.decode(token,
                                                _secret(secret, ip_address),
                                                algorithms=['HS256'])
         logger.debug('Unpacked captcha token: %s', claims)
-    except jwt.exceptions.DecodeError:  # type: ignore
+    except jwt.exceptions.ExpiredSignatureError:  # type: ignore
+        logger.debug('captcha token expired')
+        raise InvalidCaptchaToken('Expired token')
+    except jwt.exceptions.InvalidTokenError:  # type: ignore
         raise InvalidCaptchaToken('Could not decode token')
     try:
-        now = datetime.now(tz=UTC)
-        if dateutil.parser.parse(claims['expires']) <= now:
-            logger.debug('captcha token expired: %s', claims['expires'])
-            raise InvalidCaptchaToken('Expired token')
+        if 'exp' not in claims:
+            # v1 token, with the expiry as an ISO-8601 string
+            if datetime.fromisoformat(claims['expires']) <= datetime.now(tz=UTC):
+                logger.debug('captcha token expired: %s', claims['expires'])
+                raise InvalidCaptchaToken('Expired token')
         value: str = claims['value']
         return value
-    except (KeyError, ValueError) as e:
+    except (KeyError, ValueError, TypeError) as e:
         logger.debug('captcha token invalid: %s', e)
         raise InvalidCaptchaToken('Malformed content') from e
 
@@ -137,7 +157,7 @@ def new(secret: str, ip_address: str, expires: int = 300) -> str:
     """
     claims = {
         'value': _generate_random_string(),
-        'expires': (datetime.now(tz=UTC) + timedelta(seconds=300)).isoformat()
+        'exp': int(time()) + expires
     }
     return jwt.encode(claims, _secret(secret, ip_address))
 
@@ -169,11 +189,145 @@ def render(token: str, secret: str, ip_address: str,
 
     """
     value = unpack(token, secret, ip_address)
+    return io.BytesIO(_render_png(token, value, font))
+
+
+@lru_cache(maxsize=8)
+def _image_captcha(font: Optional[str] = None) -> ImageCaptcha:
+    """Get the :class:`ImageCaptcha` for ``font``, so the font is loaded once."""
     if font is not None:
-        image = ImageCaptcha(fonts=[font], width=400)
-    else:
-        image = ImageCaptcha()
-    data: io.BytesIO = image.generate(value)
+        return ImageCaptcha(fonts=[font], width=400)
+    return ImageCaptcha()
+
+
+_rasterize_lock = Lock()
+
+
+def _rasterize(value: str, font: Optional[str] = None) -> bytes:
+    """Draw the captcha image for ``value`` as PNG bytes.
+
+    The :class:`ImageCaptcha` and its FreeType fonts are shared by all the
+    threads of the process, and Pillow doesn't make them safe to draw with
+    concurrently, so one image is drawn at a time per process. Drawing holds
+    the GIL most of the time anyway, the render pool draws in parallel.
+    """
+    with _rasterize_lock:
+        data: io.BytesIO = _image_captcha(font).generate(value)
+    return data.getvalue()
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_png(token: str, value: str, font: Optional[str] = None) -> bytes:
+    """Rasterize the captcha image for ``value``.
+
+    This is cached by ``token`` so that reloading a captcha doesn't render it
+    again. Only call this after the token has been checked with
+    :func:`unpack`.
+
+    If a render pool is running (see :func:`init_render_pool`) the image is
+    drawn there. If the pool is full or broken, or the image is still queued
+    after the timeout, it is drawn in this thread instead.
+
+    Raises
+    ------
+    :class:`RenderTimeout`
+        The pool is still drawing the image after the timeout. It is not
+        drawn again here, that would double the work of a saturated pool.
+    """
+    if _render_pool is not None:
+        try:
+            return _render_in_pool(value, font)
+        except (RenderPoolBusy, BrokenProcessPool) as e:
+            logger.warning('Rendering captcha in request thread: %r', e)
+    return _rasterize(value, font)
+
+
+class RenderPoolBusy(RuntimeError):
+    """The render pool can't take the image, or hasn't started on it in time."""
+
+
+class RenderTimeout(RuntimeError):
+    """The render pool is still drawing the image after the timeout."""
+
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_slots: Optional[BoundedSemaphore] = None
+_render_timeout: float = 0
+_start_barrier: Optional[Any] = None
+
+
+def init_render_pool(workers: int, max_pending: int, timeout: float) -> None:
+    """
+    Render captcha images in a pool of worker processes.
+
+    Drawing the image is pure Python CPU work that holds the GIL, a process
+    pool lets renders use other cores and keeps them from stalling the other
+    request threads.
+
+    Parameters
+    ----------
+    workers : int
+        Number of render processes.
+    max_pending : int
+        Most images queued or rendering in the pool at once. Renders beyond
+        this are done in the request thread.
+    timeout : float
+        Seconds to wait for the pool. An image not started by then is drawn
+        in the request thread, one being drawn raises :class:`RenderTimeout`.
+
+    The processes are forked before this returns. Call it while this process
+    has no other threads: a fork copies the locks that other threads hold,
+    ex. of logging or a connection pool, and a child could deadlock on them.
+
+    """
+    global _render_pool, _render_slots, _render_timeout, _start_barrier
+    shutdown_render_pool()
+    # Not spawn or forkserver: under uwsgi sys.executable is the uwsgi binary
+    context = multiprocessing.get_context('fork')
+    # The processes inherit it when they are forked
+    _start_barrier = context.Barrier(workers)
+    _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # Before Python 3.11.1 the pool forks a process per submit until it is
+    # full, not all of them on the first one. Each of these tasks blocks
+    # until all are running, so each is taken by a new process.
+    started = [_render_pool.submit(_started, RENDER_START_TIMEOUT)
+               for _ in range(workers)]
+    for future in started:
+        future.result()
+    _render_slots = BoundedSemaphore(max_pending)
+    _render_timeout = timeout
+
+
+def _started(timeout: float) -> None:
+    """Run in the pool to wait until all its processes are started."""
+    _start_barrier.wait(timeout)  # type: ignore
+
+
+def shutdown_render_pool() -> None:
+    """Stop the render pool, if any, and go back to rendering in-thread."""
+    global _render_pool, _render_slots
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+    _render_pool = _render_slots = None
+
+
+def _render_in_pool(value: str, font: Optional[str]) -> bytes:
+    pool, slots = _render_pool, _render_slots
+    if pool is None or slots is None or not slots.acquire(blocking=False):
+        raise RenderPoolBusy('No free captcha render slot')
+    try:
+        future = pool.submit(_rasterize, value, font)
+    except Exception:
+        slots.release()
+        raise
+    # The slot is freed when the render finishes, even after we time out
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        data: bytes = future.result(timeout=_render_timeout)
+    except FutureTimeout as e:
+        if future.cancel():
+            raise RenderPoolBusy('Captcha render not started in time') from e
+        raise RenderTimeout('Captcha render not done in time') from e
     return data
 
 
@@ -1,16 +1,34 @@
 """Tests for :mod:`accounts.captcha`."""
 
-from unittest import TestCase
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import TestCase, mock
 import io
+from time import sleep, time
+from timeit import timeit
 from datetime import datetime, timedelta
 from pytz import timezone, UTC
 import jwt
 from . import new, unpack, render, check, InvalidCaptchaToken, \
-    InvalidCaptchaValue
+    InvalidCaptchaValue, RenderTimeout, _image_captcha, init_render_pool, \
+    shutdown_render_pool
+from .. import stateless_captcha
 
 EASTERN = timezone('US/Eastern')
 
 
+def _slow_rasterize(value, font=None):
+    sleep(1)
+    return b''
+
+
+class _OnDemandPool(ProcessPoolExecutor):
+    """Forks a process per submit, like a fork pool before Python 3.11.1."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._safe_to_dynamically_spawn_children = True
+
+
 class TestCaptcha(TestCase):
     """Tests for :mod:`accounts.captcha`."""
 
@@ -51,7 +69,7 @@ class TestCaptcha(TestCase):
         forged_token = jwt.encode({
             'value': 'foo',
             'expires': (datetime.now(tz=UTC) + timedelta(seconds=3600)).isoformat()
-        }, 'notthesecret').decode('ascii')
+        }, 'notthesecret')
 
         with self.assertRaises(InvalidCaptchaToken):
             unpack(forged_token, secret, ip_address)
@@ -72,12 +90,12 @@ class TestCaptcha(TestCase):
 
         malformed_token = jwt.encode({
             'expires': (datetime.now(tz=UTC) + timedelta(seconds=3600)).isoformat()
-        }, secret).decode('ascii')
+        }, secret)
 
         with self.assertRaises(InvalidCaptchaToken):
             unpack(malformed_token, secret, ip_address)
 
-        malformed_token = jwt.encode({'value': 'foo'}, secret).decode('ascii')
+        malformed_token = jwt.encode({'value': 'foo'}, secret)
 
         with self.assertRaises(InvalidCaptchaToken):
             unpack(malformed_token, secret, ip_address)
@@ -97,3 +115,126 @@ class TestCaptcha(TestCase):
         token = new(secret, ip_address)
         with self.assertRaises(InvalidCaptchaValue):
             check(token, 'nope', secret, ip_address)
+
+    def test_expired_captcha(self):
+        """The captcha token has expired."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        token = new(secret, ip_address, expires=-1)
+        with self.assertRaises(InvalidCaptchaToken):
+            unpack(token, secret, ip_address)
+
+        token = jwt.encode({'value': 'foo', 'exp': int(time()) - 10},
+                           f'{secret}:{ip_address}')
+        with self.assertRaises(InvalidCaptchaToken):
+            unpack(token, secret, ip_address)
+
+    def test_v1_captcha(self):
+        """Tokens with an ISO-8601 expires claim still work."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        token = jwt.encode({
+            'value': 'foo',
+            'expires': (datetime.now(tz=UTC) + timedelta(seconds=300)).isoformat()
+        }, f'{secret}:{ip_address}')
+        self.assertEqual(unpack(token, secret, ip_address), 'foo')
+
+        token = jwt.encode({
+            'value': 'foo',
+            'expires': (datetime.now(tz=UTC) - timedelta(seconds=1)).isoformat()
+        }, f'{secret}:{ip_address}')
+        with self.assertRaises(InvalidCaptchaToken):
+            unpack(token, secret, ip_address)
+
+    def test_throughput(self):
+        """Benchmark new and check, run with ``pytest -s`` to see it."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        number = 2000
+        v1_token = jwt.encode({
+            'value': 'foo',
+            'expires': (datetime.now(tz=UTC) + timedelta(seconds=300)).isoformat()
+        }, f'{secret}:{ip_address}')
+        token = new(secret, ip_address)
+        value = unpack(token, secret, ip_address)
+        new_time = timeit(lambda: new(secret, ip_address), number=number)
+        check_time = timeit(lambda: check(token, value, secret, ip_address),
+                            number=number)
+        v1_time = timeit(lambda: check(v1_token, 'foo', secret, ip_address),
+                         number=number)
+        print(f"\ncaptcha new: {number / new_time:.0f}/s,"
+              f" check: {number / check_time:.0f}/s,"
+              f" check v1 token: {number / v1_time:.0f}/s")
+
+    def test_render_cached(self):
+        """Rendering the same token again gives the same image."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        token = new(secret, ip_address)
+        first = render(token, secret, ip_address).read()
+        self.assertEqual(render(token, secret, ip_address).read(), first)
+        self.assertIs(_image_captcha(None), _image_captcha(None),
+                      "The ImageCaptcha is reused")
+
+        other = render(new(secret, ip_address), secret, ip_address).read()
+        self.assertNotEqual(other, first)
+
+        with self.assertRaises(InvalidCaptchaToken):
+            render(token, secret, '10.10.10.10')
+
+    def test_render_from_threads(self):
+        """The shared ImageCaptcha draws from several threads."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        tokens = [new(secret, ip_address) for _ in range(16)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            images = list(pool.map(lambda token: render(token, secret, ip_address).read(),
+                                   tokens))
+        self.assertTrue(all(image.startswith(b"\x89PNG") for image in images))
+
+    def test_render_pool(self):
+        """Render in worker processes."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        init_render_pool(2, 2, 10)
+        try:
+            self.assertEqual(len(stateless_captcha._render_pool._processes), 2,
+                             "The processes are forked by init_render_pool")
+            data = render(new(secret, ip_address), secret, ip_address)
+            self.assertTrue(data.read().startswith(b"\x89PNG"))
+        finally:
+            shutdown_render_pool()
+
+    def test_render_pool_forked_on_demand(self):
+        """All the processes are forked if the pool forks them on demand."""
+        with mock.patch.object(stateless_captcha, 'ProcessPoolExecutor',
+                               _OnDemandPool):
+            init_render_pool(3, 3, 10)
+        try:
+            self.assertEqual(len(stateless_captcha._render_pool._processes), 3,
+                             "The processes are forked by init_render_pool")
+        finally:
+            shutdown_render_pool()
+
+    def test_render_pool_full(self):
+        """Render in this thread when the pool can't take more work."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        init_render_pool(1, 0, 10)
+        try:
+            data = render(new(secret, ip_address), secret, ip_address)
+            self.assertTrue(data.read().startswith(b"\x89PNG"))
+        finally:
+            shutdown_render_pool()
+
+    def test_render_pool_timeout(self):
+        """An image still rendering in the pool is not rendered again."""
+        secret = 'foo'
+        ip_address = '127.0.0.1'
+        with mock.patch.object(stateless_captcha, '_rasterize', _slow_rasterize):
+            init_render_pool(1, 2, 0.1)
+            try:
+                with self.assertRaises(RenderTimeout):
+                    render(new(secret, ip_address), secret, ip_address)
+            finally:
+                shutdown_render_pool()
@@ -0,0 +1,65 @@
+"""Cache of usernames and emails known to be taken.
+
+Registration checks that the username and email are not already used, and
+the live availability check does so on every keystroke. Bots retrying a
+registration ask about the same values over and over. A value that is taken
+almost always stays taken, so values seen to be taken are kept for a short
+TTL and answered without a query. Free values are not cached, they can be
+taken by the next registration.
+
+The cache is per process and bounded, the least recently used values are
+dropped first.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Tuple
+
+
+class TakenCache:
+    """Bounded TTL cache of taken values, keyed by kind and value."""
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Make an empty cache.
+
+        Parameters
+        ----------
+        ttl : float
+            Seconds a value is known to be taken for. If 0, nothing is cached.
+        max_size : int
+            Most values to keep.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._taken: 'OrderedDict[Tuple[str, str], float]' = OrderedDict()
+        self._lock = Lock()
+
+    def is_taken(self, kind: str, value: str) -> bool:
+        """Check if ``value`` of ``kind``, ex. ``'email'``, is known to be taken."""
+        key = (kind, value)
+        with self._lock:
+            added = self._taken.get(key)
+            if added is None:
+                return False
+            if monotonic() - added >= self.ttl:
+                del self._taken[key]
+                return False
+            self._taken.move_to_end(key)
+            return True
+
+    def add(self, kind: str, value: str) -> None:
+        """Record that ``value`` of ``kind`` is taken."""
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        key = (kind, value)
+        with self._lock:
+            self._taken[key] = monotonic()
+            self._taken.move_to_end(key)
+            while len(self._taken) > self.max_size:
+                self._taken.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget all values."""
+        with self._lock:
+            self._taken.clear()
@@ -0,0 +1,144 @@
+"""Timing of the phases of a request.
+
+Wrap a phase in :func:`span`::
+
+    with timing.span('authn'):
+        ...
+
+The spans of a request are sent in a ``Server-Timing`` header when
+``SERVER_TIMING`` is set. When ``TIMING_METRICS`` is set they are also added
+to per-process histograms that ``/metrics`` serves in the Prometheus text
+format.
+"""
+
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, has_app_context
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds in seconds of the histogram buckets."""
+
+
+class Histograms:
+    """Histograms of span durations, counts of failed spans, and gauges, by name."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._buckets: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def gauge(self, name: str, value: Callable[[], float]) -> None:
+        """Serve ``value()`` as the gauge ``admin_webapp_<name>``."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float, failed: bool = False) -> None:
+        """Add a span to the histogram of `name`."""
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = [0] * (len(BUCKETS) + 1)
+                self._sums[name] = 0.0
+                self._errors[name] = 0
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self._buckets[name][i] += 1
+            self._buckets[name][-1] += 1
+            self._sums[name] += seconds
+            self._errors[name] += failed
+
+    def exposition(self) -> str:
+        """Get the histograms in the Prometheus text format."""
+        lines = ['# TYPE admin_webapp_phase_seconds histogram']
+        with self._lock:
+            for name, counts in sorted(self._buckets.items()):
+                for bound, count in zip(BUCKETS, counts):
+                    lines.append(f'admin_webapp_phase_seconds_bucket'
+                                 f'{{phase="{name}",le="{bound}"}} {count}')
+                lines.append(f'admin_webapp_phase_seconds_bucket'
+                             f'{{phase="{name}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'admin_webapp_phase_seconds_sum{{phase="{name}"}} '
+                             f'{self._sums[name]}')
+                lines.append(f'admin_webapp_phase_seconds_count{{phase="{name}"}} '
+                             f'{counts[-1]}')
+            lines.append('# TYPE admin_webapp_phase_errors_total counter')
+            for name, errors in sorted(self._errors.items()):
+                lines.append(f'admin_webapp_phase_errors_total{{phase="{name}"}} {errors}')
+            gauges = sorted(self._gauges.items())
+        for name, value in gauges:  # Not under the lock, they may be slow
+            lines.append(f'# TYPE admin_webapp_{name} gauge')
+            lines.append(f'admin_webapp_{name} {value()}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Histograms()
+
+
+class Timings:
+    """The spans of one request."""
+
+    def __init__(self, metrics: Optional[Histograms] = None) -> None:
+        self.spans: List[Tuple[str, float]] = []
+        self.metrics = metrics
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the block as the phase `name`."""
+        start = perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            seconds = perf_counter() - start
+            self.spans.append((name, seconds))
+            if self.metrics is not None:
+                self.metrics.observe(name, seconds, failed)
+
+    def server_timing(self) -> str:
+        """Get the spans as a ``Server-Timing`` header value.
+
+        Spans with the same name, like the attempts of a retried call, are
+        added up.
+        """
+        totals: Dict[str, Tuple[float, int]] = {}
+        for name, seconds in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return ', '.join(f'{name};dur={total * 1000:.1f}'
+                         + (f';desc="{count} attempts"' if count > 1 else '')
+                         for name, (total, count) in totals.items())
+
+
+def current() -> Timings:
+    """Get the timings of the current app context.
+
+    Outside of an app context a new :class:`Timings` is returned each time, so
+    spans there are not recorded.
+    """
+    if not has_app_context():
+        return Timings()
+    if 'timings' not in g:
+        g.timings = Timings(METRICS if current_app.config['TIMING_METRICS'] else None)
+    return g.timings  # type: ignore
+
+
+def span(name: str) -> ContextManager[None]:
+    """Time the block as the phase `name` of the current request."""
+    return current().span(name)
+
+
+def _add_server_timing(response: Response) -> Response:
+    if 'timings' in g and g.timings.spans:
+        response.headers['Server-Timing'] = g.timings.server_timing()
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Add the ``Server-Timing`` header to responses if configured."""
+    if app.config['SERVER_TIMING']:
+        app.after_request(_add_server_timing)
@@ -0,0 +1,155 @@
+"""Cache of the data shown on the admin user page.
+
+The user page is the most visited admin page, and admins go back and forth
+between it and the queues, so the same users are loaded over and over. The
+data of a user is kept for ``USER_CACHE_TTL`` seconds and dropped when a
+change about the user is committed:
+
+- ORM objects with a ``user_id``, ``endorsee_id`` or ``affected_user`` that
+  are added, changed or deleted in the app's DB session drop that user when
+  the session commits,
+- the users affected by the admin audit rows written at the commit, see
+  :mod:`admin_webapp.admin_log`, are dropped too,
+- controllers that change rows with Core statements call
+  :meth:`UserCache.invalidate` after they commit.
+
+The cache is per process and bounded, the least recently used users are
+dropped first. Invalidation in one uwsgi worker does not reach the others,
+those see the change when their entry expires.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, Set, Tuple
+
+from flask import Flask, current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+USER_ATTRIBUTES = ('user_id', 'endorsee_id', 'affected_user')
+"""Attributes of ORM objects that are the ID of a user the object is about."""
+
+
+class UserCache:
+    """Bounded TTL cache of user page data, keyed by user ID."""
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Make an empty cache.
+
+        Parameters
+        ----------
+        ttl : float
+            Seconds the data of a user is good for. If 0, nothing is cached.
+        max_size : int
+            Most users to keep.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._users: 'OrderedDict[int, Tuple[float, Any]]' = OrderedDict()
+        # Loads running per user, and how often the user was invalidated
+        # while they ran, so a load from before a write isn't stored
+        self._loading: Dict[int, int] = {}
+        self._generations: Dict[int, int] = {}
+        self._lock = Lock()
+
+    def get(self, user_id: int, load: Callable[[], Any]) -> Any:
+        """Get the data of the user, calling ``load`` if it is missing or stale.
+
+        ``load`` is called without the lock held. If it returns `None`, ex.
+        for a user that doesn't exist, that is not cached. Neither is the data
+        of a user invalidated while ``load`` ran, it may be from before the
+        write.
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return load()
+        now = monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._users.move_to_end(user_id)
+                return cached[1]
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+            generation = self._generations.get(user_id, 0)
+        value = None
+        try:
+            value = load()
+        finally:
+            with self._lock:
+                invalidated = self._generations.get(user_id, 0) != generation
+                self._loading[user_id] -= 1
+                if not self._loading[user_id]:
+                    del self._loading[user_id]
+                    self._generations.pop(user_id, None)
+                if value is not None and not invalidated:
+                    self._users[user_id] = (now, value)
+                    self._users.move_to_end(user_id)
+                    while len(self._users) > self.max_size:
+                        self._users.popitem(last=False)
+        return value
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        """Drop the data of the users, ex. after a write about them."""
+        with self._lock:
+            for user_id in user_ids:
+                self._users.pop(user_id, None)
+                if user_id in self._loading:
+                    self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        """Drop the data of all users."""
+        with self._lock:
+            self._users.clear()
+            for user_id in self._loading:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+def _changed_users(session: Session) -> Set[int]:
+    if 'changed_users' not in session.info:
+        session.info['changed_users'] = set()
+    return session.info['changed_users']  # type: ignore
+
+
+def _is_app_session(session: Session) -> bool:
+    from .extensions import is_app_session  # extensions imports this module
+    return has_app_context() and is_app_session(current_app, session)
+
+
+def _after_flush(session: Session, flush_context: Any) -> None:
+    if not _is_app_session(session):
+        return
+    changed = _changed_users(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        for attribute in USER_ATTRIBUTES:
+            user_id = getattr(obj, attribute, None)
+            if isinstance(user_id, int):
+                changed.add(user_id)
+
+
+def _before_commit(session: Session) -> None:
+    # Before admin_log writes the audit rows and takes them off g
+    rows = g.get('audit_rows') if _is_app_session(session) else None
+    if rows:
+        _changed_users(session).update(row['affected_user'] for row in rows)
+
+
+def _after_commit(session: Session) -> None:
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        current_app.extensions['user_cache'].invalidate(changed)
+
+
+def _after_soft_rollback(session: Session, previous_transaction: Any) -> None:
+    session.info.pop('changed_users', None)
+
+
+def init_app(app: Flask) -> None:
+    """Make the user cache and drop users when changes about them commit."""
+    from .extensions import get_db  # extensions imports this module
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_TTL'],
+                                             app.config['USER_CACHE_SIZE'])
+    db_session = get_db(app).session
+    event.listen(db_session, 'after_flush', _after_flush)
+    event.listen(db_session, 'before_commit', _before_commit, insert=True)
+    event.listen(db_session, 'after_commit', _after_commit)
+    event.listen(db_session, 'after_soft_rollback', _after_soft_rollback)
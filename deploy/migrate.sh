@@ -0,0 +1,12 @@
+#!/bin/bash
+# Create the DB indexes of the admin app that don't exist yet, see
+# admin_webapp/indexes.py. Run with the image that is about to be rolled out,
+# from a host that can reach the DB. It is safe to run more than once.
+set -euvf
+
+source config.sh
+
+docker run --rm \
+       --env-file=env_values.txt \
+       $IMAGE_URL \
+       python -m admin_webapp.indexes
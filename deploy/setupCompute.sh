@@ -20,6 +20,9 @@ gcloud compute firewall-rules create allow-accounts-health-check \
        --source-ranges 130.211.0.0/22,35.191.0.0/16 \
        --network default
 
+# Create the DB indexes the image needs before it serves requests
+./migrate.sh || exit 1
+
 TEMPLATE="accounts-template-$(date +%Y%m%d-%H%M%S)"
 
 # make template
@@ -33,13 +36,15 @@ gcloud compute instance-templates create-with-container $TEMPLATE \
 
 # Make health check for instance group
 # Host is mandatory since Flask will mysteriously 404 if it deosn't match SERVER_NAME
+# /health/live doesn't touch the DB or Redis, so an outage of either doesn't get
+# instances recreated. /health/ready reports on them for monitoring.
 gcloud compute health-checks create http accounts-health-check \
        --project=$PROJECT \
        --check-interval=45s \
        --timeout=15s \
        --unhealthy-threshold=3 \
        --host=phoenix.arxiv.org \
-       --request-path=/login \
+       --request-path=/health/live \
        --port=$PORT
 
 # make instance group
@@ -7,6 +7,9 @@ TEMPLATE="accounts-template-$(date +%Y%M%d-%H%M%S)"
 
 #### UPDATE PROCESS ####
 
+# create the DB indexes the new image needs before it serves requests
+./migrate.sh
+
 # create a new template with a new name
 gcloud compute instance-templates create-with-container $TEMPLATE \
        --machine-type e2-small \
@@ -28,6 +28,7 @@ from sqlalchemy.orm import Session
 from arxiv_db import test_load_db_file, models
 
 from admin_webapp.factory import create_web_app
+from admin_webapp.indexes import create_indexes
 
 DB_FILE = "./pytest.db"
 
@@ -73,6 +74,7 @@ def db(engine):
     print("Making tables...")
     from arxiv_db.tables import arxiv_tables
     arxiv_tables.metadata.create_all(bind=engine)
+    create_indexes(engine)
     print("Done making tables.")
     test_load_db_file(engine, SQL_DATA_FILE)
     yield engine
@@ -155,6 +157,10 @@ def app(db, secret, admin_user):
     app.config['CLASSIC_DATABASE_URI'] = db.url
     app.config['SQLALCHEMY_DATABASE_URI'] = db.url
     app.config['REDIS_FAKE'] = True
+    app.config['SQL_QUERY_STATS'] = True
+    app.config['SQL_QUERY_BUDGET_RAISE'] = True # Fail views over their query_budget
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    app.config['RATE_LIMIT'] = False # Enabled by the tests of it
     return app
 
 
@@ -0,0 +1,102 @@
+"""Tests for the batched writes of :mod:`admin_webapp.admin_log`."""
+from unittest import mock
+
+import pytest
+from sqlalchemy import select, text, update
+
+from arxiv_db.models import TapirAdminAudit
+
+from admin_webapp import query_stats
+from admin_webapp.admin_log import AuditBuffer, audit_admin, audit_admin_many
+from admin_webapp.extensions import get_db
+
+
+@pytest.fixture
+def request_ctx(app):
+    with app.test_request_context('/', environ_base={'REMOTE_ADDR': '10.0.0.1'}) as ctx:
+        ctx.request.auth = mock.MagicMock(session_id=7)
+        ctx.request.auth.user.user_id = 59999
+        yield ctx
+
+
+def audit_rows(app, comment):
+    return get_db(app).session.scalars(
+        select(TapirAdminAudit).where(TapirAdminAudit.comment == comment)).all()
+
+
+def test_one_insert_at_commit(app, request_ctx):
+    session = get_db(app).session
+    audit_admin_many([(59999, '1'), (59999, '2'), (59999, '3')],
+                     'add-paper-owner-2', comment='test_one_insert')
+    audit_admin(59999, 'add-paper-owner-2', '4', comment='test_one_insert')
+    assert audit_rows(app, 'test_one_insert') == [], 'Not written before commit'
+    session.commit()
+    rows = audit_rows(app, 'test_one_insert')
+    assert sorted(row.data for row in rows) == ['1', '2', '3', '4']
+    inserts = [statement for statement in query_stats.current().statements
+               if statement.startswith('INSERT INTO tapir_admin_audit')]
+    assert len(inserts) == 1
+    assert query_stats.current().statements[inserts[0]] == 1
+
+
+def test_rolled_back(app, request_ctx):
+    session = get_db(app).session
+    session.execute(update(TapirAdminAudit)  # The change that is audited
+                    .where(TapirAdminAudit.comment == 'test_rolled_back')
+                    .values(data='0'))
+    audit_admin(59999, 'add-paper-owner-2', '1', comment='test_rolled_back')
+    session.rollback()
+    session.commit()
+    assert audit_rows(app, 'test_rolled_back') == []
+
+
+def test_other_sessions_ignored(app, request_ctx):
+    """Events of other sessions of the same class don't write or drop the rows."""
+    other = get_db(app).session.session_factory()
+    try:
+        audit_admin(59999, 'add-paper-owner-2', '1', comment='test_other_sessions')
+        other.execute(text('SELECT 1'))
+        other.rollback()
+        other.execute(text('SELECT 1'))
+        other.commit()
+        assert audit_rows(app, 'test_other_sessions') == []
+    finally:
+        other.close()
+    get_db(app).session.commit()
+    assert len(audit_rows(app, 'test_other_sessions')) == 1
+
+
+def test_buffered(app, request_ctx, monkeypatch):
+    session = get_db(app).session
+    buffer = AuditBuffer(app, get_db(app).engine, max_rows=2, max_seconds=60,
+                         max_kept=10)
+    monkeypatch.setitem(app.extensions, 'audit_buffer', buffer)
+    audit_admin(59999, 'add-paper-owner-2', '1', comment='test_buffered')
+    session.commit()
+    assert audit_rows(app, 'test_buffered') == [], 'Buffered'
+    audit_admin(59999, 'add-paper-owner-2', '2', comment='test_buffered')
+    session.commit()
+    assert len(audit_rows(app, 'test_buffered')) == 2, 'Written when full'
+    audit_admin(59999, 'add-paper-owner-2', '3', comment='test_buffered')
+    session.commit()
+    buffer.flush()
+    assert len(audit_rows(app, 'test_buffered')) == 3
+
+
+def test_buffered_write_failed(app, request_ctx, monkeypatch, caplog):
+    """Rows that fail to be written are kept for the next write, up to a limit."""
+    buffer = AuditBuffer(app, get_db(app).engine, max_rows=2, max_seconds=60,
+                         max_kept=3)
+    monkeypatch.setitem(app.extensions, 'audit_buffer', buffer)
+    session = get_db(app).session
+    with mock.patch('admin_webapp.admin_log._write', side_effect=RuntimeError):
+        for data in '1234':
+            audit_admin(59999, 'add-paper-owner-2', data,
+                        comment='test_buffered_write_failed')
+            session.commit()
+    assert audit_rows(app, 'test_buffered_write_failed') == []
+    assert '10.0.0.1' not in caplog.text, "The IPs are not logged"
+    assert 'Dropped 1 audit rows' in caplog.text
+    buffer.flush()
+    rows = audit_rows(app, 'test_buffered_write_failed')
+    assert sorted(row.data for row in rows) == ['1', '2', '3']
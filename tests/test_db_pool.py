@@ -0,0 +1,54 @@
+"""Tests for the shared, fork safe DB engine."""
+import os
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from admin_webapp.extensions import SharedSQLAlchemy, get_db
+
+
+@pytest.fixture
+def pool_app(tmp_path):
+    app = Flask('pool')
+    app.config.from_pyfile(os.path.join(os.path.dirname(__file__), '../admin_webapp/config.py'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path}/pool.db'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                                   poolclass=QueuePool)
+    legacy_db = SQLAlchemy()
+    legacy_db.init_app(app)
+    SharedSQLAlchemy(app)
+    return app, legacy_db
+
+
+def test_one_engine(pool_app):
+    app, legacy_db = pool_app
+    with app.app_context():
+        engine = get_db(app).engine
+        assert legacy_db.get_engine(app) is engine
+        assert engine.pool._recycle == app.config['DB_POOL_RECYCLE']
+        assert engine.pool._pre_ping == app.config['DB_POOL_PRE_PING']
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_no_connections_across_fork(pool_app):
+    app, _ = pool_app
+    with app.app_context():
+        engine = get_db(app).engine
+        with engine.connect() as conn:
+            parent_dbapi = conn.connection.dbapi_connection
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        with app.app_context(), engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            os.write(write, b'new' if conn.connection.dbapi_connection is not parent_dbapi
+                     else b'same')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 4) == b'new'
+    with app.app_context(), engine.connect() as conn:
+        assert conn.connection.dbapi_connection is parent_dbapi, "Parent's is still usable"
@@ -0,0 +1,51 @@
+"""Tests for the liveness and readiness endpoints."""
+import pytest
+
+from admin_webapp.controllers import health
+
+
+@pytest.fixture
+def fresh_checks(monkeypatch):
+    monkeypatch.setattr(health, '_last', None)
+
+
+def test_live(app):
+    resp = app.test_client().get('/health/live')
+    assert resp.status_code == 200
+    assert resp.data == b'OK'
+
+
+def test_ready(app, fresh_checks):
+    resp = app.test_client().get('/health/ready')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['status'] == 'ok'
+    assert set(data['checks']) == {'db', 'redis'}
+    assert all(check['ok'] and check['latency_ms'] >= 0
+               for check in data['checks'].values())
+
+
+def test_ready_degraded(app, fresh_checks, monkeypatch):
+    def check_db():
+        raise ConnectionError('DB down')
+    monkeypatch.setitem(health.CHECKS, 'db', check_db)
+    resp = app.test_client().get('/health/ready')
+    assert resp.status_code == 503
+    data = resp.get_json()
+    assert data['status'] == 'degraded'
+    assert not data['checks']['db']['ok']
+    assert data['checks']['db']['error'] == 'ConnectionError'
+    assert data['checks']['redis']['ok']
+
+
+def test_ready_cached(app, fresh_checks, monkeypatch):
+    calls = []
+    monkeypatch.setitem(health.CHECKS, 'db', lambda: calls.append(1))
+    client = app.test_client()
+    for _ in range(5):
+        assert client.get('/health/ready').status_code == 200
+    assert len(calls) == 1, "Checks are run once per HEALTH_CHECK_CACHE_TTL"
+
+    monkeypatch.setitem(app.config, 'HEALTH_CHECK_CACHE_TTL', 0)
+    client.get('/health/ready')
+    assert len(calls) == 2
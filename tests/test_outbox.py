@@ -0,0 +1,90 @@
+"""Tests for :mod:`admin_webapp.outbox`."""
+from unittest import mock
+
+import pytest
+from flask import Flask
+
+from admin_webapp import timing
+from admin_webapp.outbox import Outbox
+
+
+@pytest.fixture
+def flask_app():
+    app = Flask('test')
+    app.config['TIMING_METRICS'] = False
+    return app
+
+
+def make_outbox(app, tmp_path, handle, **kwargs):
+    return Outbox(app, 'test', str(tmp_path / 'outbox.db'), handle, **kwargs)
+
+
+def test_drain(flask_app, tmp_path):
+    handled = []
+    outbox = make_outbox(flask_app, tmp_path, handled.append)
+    with mock.patch.object(outbox, 'start'):
+        outbox.put('a')
+        outbox.put('b')
+    assert outbox.depth()[0] == 2
+    assert outbox.drain() == 2
+    assert handled == ['a', 'b']
+    assert outbox.depth() == (0, 0.0)
+
+
+def test_background(flask_app, tmp_path):
+    handled = []
+    outbox = make_outbox(flask_app, tmp_path, handled.append)
+    outbox.put('a')
+    for _ in range(100):
+        if outbox.depth()[0] == 0:
+            break
+        outbox._wake.wait(0.01)
+    assert handled == ['a']
+
+
+def test_retry(flask_app, tmp_path):
+    handle = mock.MagicMock(side_effect=[IOError('DB down'), None])
+    outbox = make_outbox(flask_app, tmp_path, handle, retry_delay=0)
+    with mock.patch.object(outbox, 'start'):
+        outbox.put('a')
+    assert outbox.drain() == 1
+    assert outbox.depth()[0] == 1, 'Failed item is kept'
+    assert outbox.drain() == 1
+    assert outbox.depth()[0] == 0
+    assert handle.call_count == 2
+
+
+def test_dropped(flask_app, tmp_path):
+    handle = mock.MagicMock(side_effect=IOError('DB down'))
+    outbox = make_outbox(flask_app, tmp_path, handle, retry_delay=0,
+                         max_attempts=2)
+    with mock.patch.object(outbox, 'start'):
+        outbox.put('a')
+    outbox.drain()
+    outbox.drain()
+    assert outbox.depth()[0] == 0
+    assert outbox.drain() == 0
+
+
+def test_claimed_once(flask_app, tmp_path):
+    """A claimed item isn't handed to another worker."""
+    outbox = make_outbox(flask_app, tmp_path, lambda item: None)
+    other = make_outbox(flask_app, tmp_path, lambda item: None)
+    with mock.patch.object(outbox, 'start'):
+        outbox.put('a')
+    assert len(outbox._claim()) == 1
+    assert other._claim() == []
+
+
+def test_metrics(flask_app, tmp_path):
+    flask_app.config['TIMING_METRICS'] = True
+    outbox = make_outbox(flask_app, tmp_path, lambda item: None)
+    with mock.patch.object(outbox, 'start'):
+        outbox.put('a')
+    text = timing.METRICS.exposition()
+    assert 'admin_webapp_test_outbox_depth 1' in text
+    assert 'admin_webapp_test_outbox_lag_seconds ' in text
+    outbox.drain()
+    text = timing.METRICS.exposition()
+    assert 'admin_webapp_test_outbox_depth 0' in text
+    assert 'admin_webapp_phase_seconds_count{phase="test_outbox_drain"} 1' in text
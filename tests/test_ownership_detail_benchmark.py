@@ -0,0 +1,116 @@
+"""Row count and latency of ownership_detail for a prolific author.
+
+Compares the loader options used by :func:`ownership_detail` with the
+previous all-``joinedload`` options, which joined in every paper the user
+owns. Run with ``pytest -s`` to see the numbers.
+"""
+from datetime import datetime
+from time import perf_counter
+
+import pytest
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session, joinedload
+
+from arxiv_db.models import OwnershipRequests, OwnershipRequestsAudit, \
+    Documents, TapirUsers, EndorsementRequests
+from arxiv_db.models.associative_tables import t_arXiv_ownership_requests_papers, \
+    t_arXiv_paper_owners
+
+from admin_webapp.controllers.ownership import DETAIL_LOADER_OPTIONS
+from admin_webapp.extensions import get_db
+
+PROLIFIC_USER_ID = 246233
+OWNED_PAPERS = 2000
+REQUEST_ID = 101
+FIRST_DOCUMENT_ID = 500000
+
+JOINEDLOAD_OPTIONS = (
+    joinedload(OwnershipRequests.user).joinedload(TapirUsers.tapir_nicknames),
+    joinedload(OwnershipRequests.user).joinedload(TapirUsers.owned_papers),
+    joinedload(OwnershipRequests.request_audit),
+    joinedload(OwnershipRequests.documents),
+    joinedload(OwnershipRequests.endorsement_request).joinedload(EndorsementRequests.audit),
+)
+
+
+@pytest.fixture(scope='module')
+def prolific_author(db):
+    """A user who owns `OWNED_PAPERS` papers and requests two more.
+
+    The rows are deleted after this module, the other tests use the same DB.
+    """
+    with Session(db) as session:
+        docs = [dict(document_id=FIRST_DOCUMENT_ID + i, paper_id=f'9901.{i:05d}',
+                     title='bogus title', submitter_email='frank@example.com',
+                     authors='Franky, Frank', submitter_id=PROLIFIC_USER_ID,
+                     primary_subject_class='hep-ph')
+                for i in range(OWNED_PAPERS + 2)]
+        session.execute(insert(Documents), docs)
+        session.execute(insert(t_arXiv_paper_owners),
+                        [dict(document_id=doc['document_id'], user_id=PROLIFIC_USER_ID, valid=1)
+                         for doc in docs[:OWNED_PAPERS]])
+        session.add(OwnershipRequests(request_id=REQUEST_ID, user_id=PROLIFIC_USER_ID,
+                                      workflow_status='pending'))
+        session.add(OwnershipRequestsAudit(request_id=REQUEST_ID, session_id=0,
+                                           remote_addr='127.0.0.1',
+                                           tracking_cookie='127.0.0.1.1999999999999',
+                                           date=datetime.now()))
+        session.execute(insert(t_arXiv_ownership_requests_papers),
+                        [dict(request_id=REQUEST_ID, document_id=doc['document_id'])
+                         for doc in docs[-2:]])
+        session.commit()
+    yield REQUEST_ID
+    with Session(db) as session:
+        session.execute(delete(t_arXiv_ownership_requests_papers)
+                        .where(t_arXiv_ownership_requests_papers.c.request_id == REQUEST_ID))
+        session.execute(delete(OwnershipRequestsAudit)
+                        .where(OwnershipRequestsAudit.request_id == REQUEST_ID))
+        session.execute(delete(OwnershipRequests)
+                        .where(OwnershipRequests.request_id == REQUEST_ID))
+        last_document_id = FIRST_DOCUMENT_ID + OWNED_PAPERS + 1
+        session.execute(delete(t_arXiv_paper_owners)
+                        .where(t_arXiv_paper_owners.c.user_id == PROLIFIC_USER_ID,
+                               t_arXiv_paper_owners.c.document_id
+                               .between(FIRST_DOCUMENT_ID, last_document_id)))
+        session.execute(delete(Documents.__table__)
+                        .where(Documents.document_id.between(FIRST_DOCUMENT_ID,
+                                                             last_document_id)))
+        session.commit()
+
+
+def _measure(app, options):
+    """Load the request with `options`, return statements, rows and seconds."""
+    with app.app_context():
+        session = get_db(app).session
+        engine = get_db(app).engine
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            start = perf_counter()
+            oreq = session.scalar(select(OwnershipRequests).options(*options)
+                                  .where(OwnershipRequests.request_id == REQUEST_ID))
+            assert oreq and len(oreq.documents) == 2
+            elapsed = perf_counter() - start
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+        # Re-run each captured statement to count the rows the DB sent back
+        with engine.connect() as conn:
+            rows = sum(len(conn.exec_driver_sql(stmt, params).fetchall())
+                       for stmt, params in statements)
+        session.remove()
+        return len(statements), rows, elapsed
+
+
+def test_detail_loader_rows(app, prolific_author):
+    old_stmts, old_rows, old_time = _measure(app, JOINEDLOAD_OPTIONS)
+    new_stmts, new_rows, new_time = _measure(app, DETAIL_LOADER_OPTIONS)
+    print(f"\nownership_detail for a user owning {OWNED_PAPERS} papers:"
+          f"\n  joinedload: {old_stmts} statements, {old_rows} rows, {old_time * 1000:.1f}ms"
+          f"\n  selectin:   {new_stmts} statements, {new_rows} rows, {new_time * 1000:.1f}ms")
+    assert old_rows >= OWNED_PAPERS
+    assert new_rows < 20
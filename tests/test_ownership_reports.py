@@ -1,13 +1,28 @@
+import csv
+import io
+import json
 from datetime import datetime
+from unittest import mock
 from sqlalchemy.orm import Session
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, update
 from flask import url_for
+from werkzeug.exceptions import BadRequest, Forbidden
 import pytest
 
+from arxiv_auth import domain
+from arxiv_auth.auth import scopes
 from arxiv_db.models import OwnershipRequests, OwnershipRequestsAudit, Documents
 from arxiv_db.models.associative_tables import t_arXiv_ownership_requests_papers, \
     t_arXiv_paper_owners
 
+from admin_webapp import query_stats
+from admin_webapp.controllers.pagination import encode_cursor, decode_cursor
+from admin_webapp.count_cache import CountCache
+from admin_webapp.extensions import get_count_cache
+from admin_webapp.indexes import INDEXES
+from admin_webapp.controllers import ownership as ownership_controllers
+from admin_webapp.routes import ownership as ownership_routes
+
 @pytest.fixture(scope='session')
 def fake_ownerships(db):
      with Session(db) as session:
@@ -82,6 +97,20 @@ def fake_ownerships(db):
          session.commit()
          return [1,2,3]
 
+@pytest.fixture
+def restore_statuses(db):
+    """Put back the workflow statuses of the requests after a test edits them."""
+    with Session(db) as session:
+        statuses = session.execute(select(OwnershipRequests.request_id,
+                                          OwnershipRequests.workflow_status)).all()
+    yield
+    with Session(db) as session:
+        for request_id, workflow_status in statuses:
+            session.execute(update(OwnershipRequests)
+                            .where(OwnershipRequests.request_id == request_id)
+                            .values(workflow_status=workflow_status))
+        session.commit()
+
 def test_get_reports(admin_client, fake_ownerships):
     resp = admin_client.get(url_for('ownership.pending'))
     assert resp.status_code == 200
@@ -105,7 +134,7 @@ def test_get_detailed_report(admin_client, fake_ownerships):
     resp = admin_client.get(url_for('ownership.display', ownership_id = 0))
     assert resp.status_code == 404
 
-def test_edits(admin_client, fake_ownerships, db):
+def test_edits(admin_client, fake_ownerships, db, restore_statuses):
     with Session(db) as session:
         oreq = session.execute(select(OwnershipRequests).where(OwnershipRequests.user_id==246231,OwnershipRequests.workflow_status=='pending')).scalar()
         request_id = oreq.request_id
@@ -152,3 +181,216 @@ def test_edits(admin_client, fake_ownerships, db):
                                              make_owner='1')
                                  )
         assert resp.status_code == 404
+
+def test_keyset_reports(admin_client, fake_ownerships):
+    for endpoint in ['ownership.pending', 'ownership.rejected', 'ownership.accepted']:
+        resp = admin_client.get(url_for(endpoint, cursor=''))
+        assert resp.status_code == 200
+
+        resp = admin_client.get(url_for(endpoint, cursor=encode_cursor('n', 0)))
+        assert resp.status_code == 200
+
+        resp = admin_client.get(url_for(endpoint, cursor='not a cursor'))
+        assert resp.status_code == 400
+
+def test_keyset_cursor():
+    assert decode_cursor('') == ('n', None)
+    assert decode_cursor(encode_cursor('n', 1234)) == ('n', 1234)
+    assert decode_cursor(encode_cursor('p', 1)) == ('p', 1)
+    with pytest.raises(BadRequest):
+        decode_cursor(encode_cursor('x', 1))
+
+def test_count_cache():
+    cache = CountCache()
+    calls = []
+    def count():
+        calls.append(1)
+        return len(calls)
+    assert cache.get('k', 60, count) == 1
+    assert cache.get('k', 60, count) == 1
+    assert cache.get('other', 60, count) == 2
+    cache.invalidate()
+    assert cache.get('k', 60, count) == 3
+    assert cache.get('k', 0, count) == 4
+
+def test_capped_count(app, admin_client, fake_ownerships):
+    app.config['OWNERSHIP_COUNT_LIMIT'] = 1
+    get_count_cache(app).invalidate()
+    try:
+        resp = admin_client.get(url_for('ownership.pending'))
+        assert resp.status_code == 200
+        assert 'Found 1+ ownership requests' in resp.get_data(as_text=True)
+
+        def count_queries():
+            return sum(count for statement, count in query_stats.current().statements.items()
+                       if 'count(' in statement.lower())
+
+        with app.test_request_context():
+            get_count_cache(app).invalidate()
+            counts = count_queries()
+            data = ownership_controllers.ownership_listing('pending', 12, 1, 7)
+            assert data['count_capped']
+            list(data['ownership_requests'])  # Done with the cursor, as the template is
+            assert count_queries() == counts + 1
+            queries = query_stats.current().count
+            data = ownership_controllers.ownership_listing('pending', 12, 1, 7)
+            list(data['ownership_requests'])
+            assert data['count'] == 1 and data['count_capped']
+            assert count_queries() == counts + 1, 'The second count is from the count cache'
+            assert query_stats.current().count == queries + 1, 'Only the page is loaded'
+    finally:
+        app.config['OWNERSHIP_COUNT_LIMIT'] = 0
+        get_count_cache(app).invalidate()
+
+def test_bulk_accept(app, admin_client, fake_ownerships, db):
+    with Session(db) as session:
+        for request_id, document_id in [(4, 4444), (5, 5555)]:
+            session.add(OwnershipRequests(request_id=request_id, user_id=246232,
+                                          workflow_status='pending'))
+            session.add(OwnershipRequestsAudit(request_id=request_id, session_id=0,
+                                               remote_addr='127.0.0.1',
+                                               tracking_cookie='127.0.0.1.1999999999999',
+                                               date=datetime.now()))
+            session.add(Documents(document_id=document_id, paper_id=f'2010.0{document_id}',
+                                  title="bogus title", submitter_email="bob@cornell.edu",
+                                  authors="Jack, Lo", submitter_id=246232,
+                                  primary_subject_class='cs.IR'))
+            session.execute(insert(t_arXiv_ownership_requests_papers)
+                            .values(request_id=request_id, document_id=document_id))
+        session.commit()
+
+        form = dict(request_id=[4, 5], is_author=1, make_owner='1')
+        resp = app.test_client().post(url_for('ownership.pending'), data=form)
+        assert resp.status_code == 401, 'Anonymous'
+        with app.test_request_context(url_for('ownership.pending'), method='POST',
+                                      data=form) as ctx:
+            ctx.request.auth = mock.MagicMock(
+                authorizations=domain.Authorizations(scopes=scopes.GENERAL_USER, classic=4))
+            with pytest.raises(Forbidden):
+                ownership_routes.pending()
+        statuses = session.scalars(select(OwnershipRequests.workflow_status)
+                                   .where(OwnershipRequests.request_id.in_([4, 5]))).all()
+        assert statuses == ['pending', 'pending'], 'Only admins accept requests'
+
+        resp = admin_client.post(url_for('ownership.pending'), data=form)
+        assert resp.status_code == 200
+
+        statuses = session.scalars(select(OwnershipRequests.workflow_status)
+                                   .where(OwnershipRequests.request_id.in_([4, 5]))).all()
+        assert statuses == ['accepted', 'accepted']
+        owned = session.execute(select(t_arXiv_paper_owners.c.document_id,
+                                       t_arXiv_paper_owners.c.added_by)
+                                .where(t_arXiv_paper_owners.c.user_id == 246232)).all()
+        assert set(owned) == {(4444, 59999), (5555, 59999)}, 'Added by the admin logged in'
+
+        resp = admin_client.post(url_for('ownership.pending'), data=form)
+        assert resp.status_code == 400, "Already accepted requests can't be bulk accepted"
+
+def test_export_csv(admin_client, fake_ownerships):
+    resp = admin_client.get(url_for('ownership.export'))
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    by_id = {int(row['request_id']): row for row in rows}
+    assert set(fake_ownerships) <= set(by_id)
+    assert by_id[1]['workflow_status'] == 'pending'
+    assert sorted(by_id[1]['paper_ids'].split(',')) == ['2010.01111', '2010.02222', '2010.03333']
+
+def test_export_jsonl(admin_client, fake_ownerships):
+    resp = admin_client.get(url_for('ownership.export', format='jsonl', status='rejected',
+                                    since='2000-01-01'))
+    assert resp.status_code == 200
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [row['request_id'] for row in rows] == [2]
+    assert rows[0]['remote_addr'] == '127.0.0.1'
+
+    resp = admin_client.get(url_for('ownership.export', format='jsonl', until='2000-01-01'))
+    assert resp.get_data(as_text=True) == ''
+
+def test_export_batches(app, fake_ownerships, monkeypatch):
+    monkeypatch.setattr(ownership_controllers, 'EXPORT_BATCH_SIZE', 1)
+    with app.test_request_context():
+        chunks = list(ownership_controllers.ownership_export('csv'))
+    assert len(chunks) >= 2, 'A chunk per batch of rows'
+    assert chunks[0].startswith('request_id,')
+
+def test_export_bad_args(admin_client):
+    assert admin_client.get(url_for('ownership.export', format='xml')).status_code == 400
+    assert admin_client.get(url_for('ownership.export', status='bogus')).status_code == 400
+    assert admin_client.get(url_for('ownership.export', since='yesterday')).status_code == 400
+
+def test_export_admin_only(app):
+    assert app.test_client().get(url_for('ownership.export')).status_code == 401
+
+    def export_as(auth_scopes, classic):
+        with app.test_request_context() as ctx:
+            ctx.request.auth = mock.MagicMock(
+                authorizations=domain.Authorizations(scopes=auth_scopes, classic=classic))
+            return ownership_routes.export()
+
+    assert export_as(scopes.ADMIN_USER, 0).status_code == 200
+    assert export_as(scopes.GENERAL_USER, 6).status_code == 200, 'flag_edit_users'
+    with pytest.raises(Forbidden):
+        export_as(scopes.GENERAL_USER, 4)
+
+def test_filtered_reports(admin_client, fake_ownerships):
+    resp = admin_client.get(url_for('ownership.pending', paper_id='2010.01111',
+                                    remote_addr='127.0.0.1', since='2000-01-01'))
+    assert resp.status_code == 200
+    resp = admin_client.get(url_for('ownership.accepted', nickname='foouser'))
+    assert resp.status_code == 200
+    resp = admin_client.get(url_for('ownership.rejected', email='bob@cornell.edu', user_id=246231))
+    assert resp.status_code == 200
+    assert admin_client.get(url_for('ownership.pending', since='soon')).status_code == 400
+
+def test_filtered_counts_not_cached(app, fake_ownerships):
+    cache = get_count_cache(app)
+    with app.test_request_context():
+        cache.invalidate()
+        data = ownership_controllers.ownership_listing('pending', 12, 1, 0,
+                                                       filters=dict(paper_id='2010.01111'))
+        assert data['count'] == 1
+        assert not cache._counts, 'A search leaves no entry in the count cache'
+        ownership_controllers.ownership_listing('pending', 12, 1, 0, filters=dict(paper_id=''))
+        assert len(cache._counts) == 1, 'Empty filters are the cached, unfiltered count'
+
+def _filtered_ids(session, workflow_status, **filters):
+    stmt, _ = ownership_controllers.ownership_listing_statements(workflow_status, 7, filters)
+    return [oreq.request_id for oreq in session.scalars(stmt).unique()]
+
+def test_filters(db, fake_ownerships):
+    with Session(db) as session:
+        assert _filtered_ids(session, 'pending', paper_id='2010.02222') == [1]
+        assert _filtered_ids(session, 'pending', paper_id='2010.09999') == []
+        assert _filtered_ids(session, 'pending', user_id=246231) == [1]
+        assert _filtered_ids(session, 'pending', nickname='not-a-user') == []
+        assert _filtered_ids(session, 'rejected', remote_addr='127.0.0.1') == [2]
+        assert _filtered_ids(session, 'rejected', remote_addr='10.0.0.1') == []
+        assert _filtered_ids(session, 'pending', until=datetime(2000, 1, 1)) == []
+
+@pytest.mark.parametrize('workflow_status,filters,search', [
+    ('pending', {}, 'ownership_requests_status_request_id'),
+    ('pending', {'user_id': 1}, 'ownership_requests_user_id_status'),
+    ('pending', {'nickname': 'foouser'}, 'ownership_requests_user_id_status'),
+    ('pending', {'email': 'bob@cornell.edu'}, 'ownership_requests_user_id_status'),
+    ('pending', {'paper_id': '2010.01111'}, 'SEARCH arXiv_documents'),
+    ('pending', {'remote_addr': '127.0.0.1'}, 'ownership_requests_audit_remote_addr_date'),
+    ('accepted', {'remote_addr': '127.0.0.1'}, 'ownership_requests_audit_remote_addr_date'),
+    ('pending', {'since': datetime(2020, 1, 1), 'until': datetime(2021, 1, 1)},
+     'ownership_requests_audit_date'),
+])
+def test_filter_plans(db, workflow_status, filters, search):
+    """Each filter is looked up on an index, with no scan of the requests."""
+    stmt, _ = ownership_controllers.ownership_listing_statements(workflow_status, 7, filters)
+    sql = str(stmt.compile(db, compile_kwargs={'literal_binds': True}))
+    with db.connect() as conn:
+        plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+    assert any(search in step for step in plan), plan
+    assert not any(step.startswith('SCAN') for step in plan), plan
+
+
+def test_indexes_not_in_shared_metadata():
+    """The admin indexes are not created by the arxiv_db metadata."""
+    names = {index.name for index in INDEXES}
+    for table in (OwnershipRequests.__table__, OwnershipRequestsAudit.__table__):
+        assert not names & {index.name for index in table.indexes}
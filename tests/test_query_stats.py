@@ -0,0 +1,81 @@
+"""Tests for the per-request SQL statement counts and query budgets."""
+import logging
+
+import pytest
+from flask import Flask, g
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from admin_webapp import query_stats
+
+
+@pytest.fixture
+def stats_app():
+    app = Flask('stats')
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://',
+                      SQLALCHEMY_TRACK_MODIFICATIONS=False,
+                      SQL_QUERY_STATS=True, SQL_SLOW_QUERY_SECONDS=1,
+                      SQL_N_PLUS_ONE_THRESHOLD=3, SQL_QUERY_BUDGET_RAISE=True,
+                      PROPAGATE_EXCEPTIONS=True)
+    db = SQLAlchemy(app)
+    query_stats.init_app(app)
+
+    @app.route('/<int:n>')
+    @query_stats.query_budget(5)
+    def run(n):
+        for _ in range(n):
+            db.session.execute(text('SELECT 1'))
+        stats = g.get('query_stats')
+        return str(stats.count if stats else None)
+
+    return app
+
+
+def test_counts_queries(stats_app):
+    assert stats_app.test_client().get('/2').data == b'2'
+
+
+def test_counts_per_request(stats_app):
+    """Requests that share an app context are counted each on their own."""
+    with stats_app.app_context():
+        client = stats_app.test_client()
+        assert client.get('/3').data == b'3'
+        assert client.get('/3').data == b'3', 'Not over the budget of 5'
+
+
+def test_budget_of_view_only(stats_app):
+    """Statements before the view, ex. to load the session, are not budgeted."""
+    db = stats_app.extensions['sqlalchemy'].db
+    stats_app.before_request(lambda: db.session.execute(text('SELECT 2')) and None)
+    assert stats_app.test_client().get('/5').data == b'6'
+
+
+def test_n_plus_one_logged(stats_app, caplog):
+    with caplog.at_level(logging.WARNING, logger='admin_webapp.query_stats'):
+        stats_app.test_client().get('/4')
+    assert 'Possible N+1 in run, 4 times: SELECT 1' in caplog.text
+
+
+def test_slow_query_logged(stats_app, caplog):
+    stats_app.config['SQL_SLOW_QUERY_SECONDS'] = 0
+    with caplog.at_level(logging.WARNING, logger='admin_webapp.query_stats'):
+        stats_app.test_client().get('/1')
+    assert 'Slow query' in caplog.text and 'in run: SELECT 1' in caplog.text
+
+
+def test_budget_exceeded(stats_app):
+    with pytest.raises(query_stats.QueryBudgetExceeded):
+        stats_app.test_client().get('/6')
+
+
+def test_disabled(stats_app):
+    stats_app.config['SQL_QUERY_STATS'] = False
+    stats_app.config['SQL_QUERY_BUDGET_RAISE'] = True
+    resp = stats_app.test_client().get('/6')
+    assert resp.status_code == 200 and resp.data == b'None', "No stats, no budget"
+
+
+def test_ownership_views_in_budget(admin_client):
+    """Listings and details run within their query_budget, or raise."""
+    for url in ['/ownership/pending', '/ownership/accepted', '/ownership/rejected']:
+        assert admin_client.get(url).status_code == 200
@@ -0,0 +1,97 @@
+"""Tests for the per client IP rate limits."""
+from unittest import mock
+
+import pytest
+
+from admin_webapp.factory import trust_proxies
+from admin_webapp.rate_limit import LocalBuckets, RedisBuckets, parse_limit
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATE_LIMIT', True)
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_LOGIN', '2/60')
+    app.extensions['rate_limit'].clear()
+    yield app
+    app.extensions['rate_limit'].clear()
+
+
+def test_parse_limit():
+    assert parse_limit('10/60') == (10, 10 / 60)
+
+
+def test_bucket_refills():
+    buckets = LocalBuckets(max_keys=10)
+    with mock.patch('admin_webapp.rate_limit.monotonic', return_value=0):
+        assert buckets.take('a', 2, 1.0) == 0
+        assert buckets.take('a', 2, 1.0) == 0
+        assert buckets.take('a', 2, 1.0) == pytest.approx(1.0)
+        assert buckets.take('b', 2, 1.0) == 0
+    with mock.patch('admin_webapp.rate_limit.monotonic', return_value=0.5):
+        assert buckets.take('a', 2, 1.0) == pytest.approx(0.5)
+    with mock.patch('admin_webapp.rate_limit.monotonic', return_value=1.0):
+        assert buckets.take('a', 2, 1.0) == 0
+
+
+def test_max_keys():
+    buckets = LocalBuckets(max_keys=1)
+    buckets.take('a', 1, 1.0)
+    buckets.take('b', 1, 1.0)
+    assert buckets.take('a', 1, 1.0) == 0
+
+
+def test_login_limited(limited):
+    client = limited.test_client()
+    with mock.patch('admin_webapp.routes.ui.authentication.login') as login:
+        login.return_value = ({}, 400, {})
+        for _ in range(2):
+            assert client.post('/login', data={}).status_code == 400
+        resp = client.post('/login', data={})
+        assert resp.status_code == 429
+        assert int(resp.headers['Retry-After']) > 0
+        assert login.call_count == 2
+        other = client.post('/login', data={},
+                            environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        assert other.status_code == 400
+
+
+def test_forwarded_clients_limited(limited, monkeypatch):
+    """Clients behind the load balancer each have their own limit."""
+    monkeypatch.setitem(limited.config, 'TRUSTED_PROXY_HOPS', 2)
+    monkeypatch.setattr(limited, 'wsgi_app', limited.wsgi_app)  # Undo the wrapping
+    trust_proxies(limited)
+    client = limited.test_client()
+
+    def post(forwarded_for):
+        return client.post('/login', data={}, environ_base={'REMOTE_ADDR': '10.0.0.9'},
+                           headers={'X-Forwarded-For': f'{forwarded_for}, 34.0.0.1'})
+
+    with mock.patch('admin_webapp.routes.ui.authentication.login') as login:
+        login.return_value = ({}, 400, {})
+        for _ in range(2):
+            assert post('192.0.2.1').status_code == 400
+        assert post('192.0.2.1').status_code == 429
+        assert post('192.0.2.2').status_code == 400, 'Another client'
+        assert post('192.0.2.3, 192.0.2.1').status_code == 429, \
+            'The client can only add addresses before its own'
+
+
+def test_login_get_not_limited(limited):
+    client = limited.test_client()
+    for _ in range(3):
+        assert client.get('/login').status_code == 200
+
+
+def test_redis_fails_open(app):
+    buckets = RedisBuckets(app)
+    with mock.patch('admin_webapp.rate_limit.SessionStore.get_session',
+                    side_effect=ConnectionError('Redis down')):
+        assert buckets.take('a', 1, 1.0) == 0
+
+
+def test_redis_buckets(app):
+    pytest.importorskip('lupa')  # fakeredis runs Lua scripts with it
+    buckets = RedisBuckets(app)
+    key = 'test_redis_buckets'
+    assert buckets.take(key, 1, 0.01) == 0
+    assert buckets.take(key, 1, 0.01) > 0
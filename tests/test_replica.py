@@ -0,0 +1,80 @@
+"""Tests for routing read only queries to a replica."""
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, select, text
+
+import arxiv_db
+from arxiv_db.models import OwnershipRequests
+
+from admin_webapp import replica
+from admin_webapp.extensions import SharedSQLAlchemy, get_db
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    app = Flask('replica')
+    app.config.from_pyfile(os.path.join(os.path.dirname(__file__), '../admin_webapp/config.py'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path}/primary.db'
+    app.config['SQLALCHEMY_REPLICA_DATABASE_URI'] = f'sqlite:///{tmp_path}/replica.db'
+    SharedSQLAlchemy(app, metadata=arxiv_db.Base.metadata)
+    replica.init_app(app)
+    for request_id, name in enumerate(['primary', 'replica']):
+        engine = create_engine(f'sqlite:///{tmp_path}/{name}.db')
+        OwnershipRequests.__table__.create(engine)
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE db (name TEXT)'))
+            conn.execute(text(f"INSERT INTO db VALUES ('{name}')"))
+            conn.execute(OwnershipRequests.__table__.insert()
+                         .values(request_id=request_id + 1, user_id=1))
+    return app
+
+
+def _read(app):
+    return replica.read_session(app).execute(text('SELECT name FROM db')).scalar()
+
+
+def test_reads_from_replica(replica_app):
+    with replica_app.app_context():
+        assert _read(replica_app) == 'replica'
+        assert get_db(replica_app).session.execute(text('SELECT name FROM db')).scalar() == 'primary'
+
+
+def test_mapped_tables_on_replica(replica_app):
+    """The bind of the app's models doesn't send replica reads to the primary."""
+    with replica_app.app_context():
+        session = replica.read_session(replica_app)
+        assert session.get_bind(OwnershipRequests) is replica_app.extensions['replica'].engine
+        assert session.scalar(select(OwnershipRequests.request_id)) == 2
+        assert get_db(replica_app).session.scalar(select(OwnershipRequests.request_id)) == 1
+
+
+def test_no_replica(replica_app):
+    replica_app.extensions.pop('replica')
+    with replica_app.app_context():
+        assert _read(replica_app) == 'primary'
+
+
+def test_lagging_replica(replica_app, monkeypatch):
+    monkeypatch.setattr(replica, 'replication_lag', lambda conn: 60.0)
+    with replica_app.app_context():
+        assert _read(replica_app) == 'primary'
+
+
+def test_stopped_replica(replica_app, monkeypatch):
+    monkeypatch.setattr(replica, 'replication_lag', lambda conn: None)
+    with replica_app.app_context():
+        assert _read(replica_app) == 'primary'
+
+
+def test_lag_checked_once_per_ttl(replica_app, monkeypatch):
+    checks = []
+    monkeypatch.setattr(replica, 'replication_lag', lambda conn: checks.append(1) or 0.0)
+    with replica_app.app_context():
+        for _ in range(3):
+            assert _read(replica_app) == 'replica'
+        assert len(checks) == 1
+        replica_app.config['DB_REPLICA_CHECK_TTL'] = 0
+        _read(replica_app)
+        assert len(checks) == 2
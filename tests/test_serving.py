@@ -0,0 +1,74 @@
+"""Checks for serving with several threads per uwsgi worker.
+
+See uwsgi.ini. Run with ``pytest -s`` to see the startup and import times.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from flask import url_for
+
+from conftest import parse_cookies
+
+from admin_webapp import stateless_captcha
+from admin_webapp.factory import create_web_app
+from admin_webapp.startup import import_times, warm_up
+
+THREADS = 8
+REQUESTS = 32
+
+
+def test_create_web_app_startup():
+    """Each uwsgi worker builds its own app (lazy-apps in uwsgi.ini), keep that
+    cheap. Raise STARTUP_TIME_BUDGET_MS for slow machines."""
+    budget_ms = int(os.environ.get('STARTUP_TIME_BUDGET_MS', '2000'))
+    start = perf_counter()
+    create_web_app()
+    elapsed_ms = (perf_counter() - start) * 1000
+    print(f"\ncreate_web_app took {elapsed_ms:.0f}ms")
+    assert elapsed_ms < budget_ms
+
+
+def test_threaded_requests(app, admin_user):
+    """Session store, SQLAlchemy and captcha are used from many threads."""
+    client = app.test_client()
+    resp = client.post('/login', data=dict(username=admin_user['email'],
+                                           password=admin_user['password_cleartext']))
+    assert resp.status_code == 303
+    cookies = parse_cookies(resp.headers.getlist('Set-Cookie'))
+    with app.test_request_context():
+        captcha_token = stateless_captcha.new(app.config['CAPTCHA_SECRET'], '127.0.0.1')
+        urls = [url_for('ui.login'),
+                url_for('ui.captcha', token=captcha_token),
+                url_for('ownership.pending'),
+                url_for('ownership.accepted')]
+
+    def get(n):
+        client = app.test_client()
+        for name in [app.config['AUTH_SESSION_COOKIE_NAME'], app.config['CLASSIC_COOKIE_NAME']]:
+            client.set_cookie('', name, cookies[name]['value'])
+        url = urls[n % len(urls)]
+        return url, client.get(url, environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(get, range(REQUESTS)))
+    assert all(code in (200, 303) for _, code in results), results
+
+
+def test_warm_up(app):
+    timings = warm_up(app)
+    assert set(timings) == {'templates', 'db', 'redis', 'taxonomy'}
+    print('\nWarm up: ' + ', '.join(f'{name} {secs * 1000:.0f}ms'
+                                    for name, secs in timings.items()))
+
+
+def test_import_time_budget():
+    """Catch slow new imports, raise IMPORT_TIME_BUDGET_MS for slow machines."""
+    budget_ms = int(os.environ.get('IMPORT_TIME_BUDGET_MS', '5000'))
+    times = import_times('admin_webapp.factory')
+    print(f'\n{"self ms":>9} {"cumulative ms":>14}  module')
+    for self_us, cumulative_us, name in times[:15]:
+        print(f'{self_us / 1000:9.1f} {cumulative_us / 1000:14.1f}  {name}')
+    total_us = next(cumulative_us for _, cumulative_us, name in times
+                    if name == 'admin_webapp.factory')
+    assert total_us / 1000 < budget_ms
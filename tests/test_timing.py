@@ -0,0 +1,62 @@
+"""Tests for the request phase timings."""
+import pytest
+from flask import Flask
+
+from admin_webapp import timing
+
+
+@pytest.fixture
+def timed_app():
+    app = Flask('timed')
+    app.config.update(SERVER_TIMING=True, TIMING_METRICS=True)
+    timing.init_app(app)
+
+    @app.route('/')
+    def index():
+        with timing.span('db'):
+            pass
+        for attempt in range(2):
+            try:
+                with timing.span('authn'):
+                    if attempt == 0:
+                        raise ConnectionError()
+            except ConnectionError:
+                pass
+        return 'OK'
+
+    return app
+
+
+def test_server_timing(timed_app, monkeypatch):
+    monkeypatch.setattr(timing, 'METRICS', timing.Histograms())
+    resp = timed_app.test_client().get('/')
+    entries = resp.headers['Server-Timing'].split(', ')
+    assert [entry.split(';')[0] for entry in entries] == ['db', 'authn']
+    assert entries[1].endswith(';desc="2 attempts"')
+
+    lines = timing.METRICS.exposition().splitlines()
+    assert 'admin_webapp_phase_seconds_count{phase="authn"} 2' in lines
+    assert 'admin_webapp_phase_seconds_bucket{phase="db",le="+Inf"} 1' in lines
+    assert 'admin_webapp_phase_errors_total{phase="authn"} 1' in lines
+    assert 'admin_webapp_phase_errors_total{phase="db"} 0' in lines
+
+
+def test_no_header_without_spans(timed_app):
+    timed_app.add_url_rule('/plain', 'plain', lambda: 'OK')
+    assert 'Server-Timing' not in timed_app.test_client().get('/plain').headers
+
+
+def test_span_outside_app_context():
+    with timing.span('nothing'):
+        pass
+
+
+def test_histogram_buckets():
+    metrics = timing.Histograms()
+    metrics.observe('x', 0.02)
+    metrics.observe('x', 20)
+    lines = metrics.exposition().splitlines()
+    assert 'admin_webapp_phase_seconds_bucket{phase="x",le="0.01"} 0' in lines
+    assert 'admin_webapp_phase_seconds_bucket{phase="x",le="0.025"} 1' in lines
+    assert 'admin_webapp_phase_seconds_bucket{phase="x",le="10.0"} 1' in lines
+    assert 'admin_webapp_phase_seconds_bucket{phase="x",le="+Inf"} 2' in lines
@@ -0,0 +1,141 @@
+"""Tests for the admin user page and :mod:`admin_webapp.user_cache`."""
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from flask import url_for
+from werkzeug.exceptions import Forbidden
+from sqlalchemy import delete, select
+
+from arxiv_auth import domain
+from arxiv_auth.auth import scopes
+from arxiv_db.models import TapirAdminAudit, TapirUsers
+
+from admin_webapp import query_stats
+from admin_webapp.admin_log import audit_admin
+from admin_webapp.controllers.user import user_detail, load_user_detail
+from admin_webapp.routes import user as user_routes
+from admin_webapp.extensions import get_db, get_user_cache
+from admin_webapp.user_cache import UserCache
+
+
+@pytest.fixture
+def request_ctx(app):
+    with app.test_request_context('/', environ_base={'REMOTE_ADDR': '10.0.0.1'}) as ctx:
+        ctx.request.auth = mock.MagicMock(session_id=7)
+        ctx.request.auth.user.user_id = 59999
+        get_user_cache(app).clear()
+        yield ctx
+
+
+def test_display(admin_client, admin_user):
+    resp = admin_client.get(url_for('user.display', user_id=59999))
+    assert resp.status_code == 200
+    text = resp.get_data(as_text=True)
+    assert 'foouser (primary)' in text
+    assert 'Cornell U.' in text
+
+
+def test_display_missing(admin_client):
+    assert admin_client.get(url_for('user.display', user_id=987654321)).status_code == 404
+
+
+def test_display_admin_only(app):
+    assert app.test_client().get(url_for('user.display', user_id=59999)).status_code == 401
+    with app.test_request_context() as ctx:
+        ctx.request.auth = mock.MagicMock(
+            authorizations=domain.Authorizations(scopes=scopes.GENERAL_USER, classic=4))
+        with pytest.raises(Forbidden):
+            user_routes.display(59999)
+
+
+def test_aggregates(app, request_ctx):
+    data = load_user_detail(59999)
+    assert data['user']['email'] == 'testadmin@example.com'
+    assert data['user']['owned_papers'] == 0
+    assert [nick['nickname'] for nick in data['nicknames']] == ['foouser']
+    assert load_user_detail(987654321) is None
+
+
+def test_cached(app, request_ctx):
+    first = user_detail(59999)
+    queries = query_stats.current().count
+    assert user_detail(59999) is first
+    assert query_stats.current().count == queries, 'No queries for a cached user'
+
+
+def test_invalidated_on_commit(app, request_ctx):
+    session = get_db(app).session
+    user_detail(59999)
+    user = session.scalar(select(TapirUsers).where(TapirUsers.user_id == 59999))
+    user.first_name = 'renamed'
+    session.commit()
+    try:
+        assert user_detail(59999)['user']['first_name'] == 'renamed'
+    finally:
+        user.first_name = 'testadmin'
+        session.commit()
+
+
+def test_invalidated_by_audit(app, request_ctx):
+    session = get_db(app).session
+    assert not any(entry['comment'] == 'test_user_audit'
+                   for entry in user_detail(59999)['admin_audit'])
+    audit_admin(59999, 'change-password', comment='test_user_audit')
+    session.commit()
+    try:
+        entries = [entry for entry in user_detail(59999)['admin_audit']
+                   if entry['comment'] == 'test_user_audit']
+        assert len(entries) == 1
+        assert isinstance(entries[0]['log_date'], datetime)
+    finally:
+        session.execute(delete(TapirAdminAudit)
+                        .where(TapirAdminAudit.comment == 'test_user_audit'))
+        session.commit()
+
+
+def test_not_invalidated_on_rollback(app, request_ctx):
+    session = get_db(app).session
+    first = user_detail(59999)
+    user = session.scalar(select(TapirUsers).where(TapirUsers.user_id == 59999))
+    user.first_name = 'rolled back'
+    session.flush()
+    session.rollback()
+    assert user_detail(59999) is first
+
+
+def test_user_cache():
+    cache = UserCache(ttl=60, max_size=2)
+    load = mock.MagicMock(side_effect=lambda: object())
+    first = cache.get(1, load)
+    assert cache.get(1, load) is first
+    assert load.call_count == 1
+    cache.get(2, load)
+    cache.get(3, load)
+    assert cache.get(1, load) is not first, 'Least recently used is dropped'
+    cache.invalidate([1])
+    cache.get(1, load)
+    assert load.call_count == 5
+    assert cache.get(4, lambda: None) is None
+    assert cache.get(4, lambda: 'loaded') == 'loaded', 'None is not cached'
+
+    cache = UserCache(ttl=0, max_size=2)
+    assert cache.get(1, load) is not cache.get(1, load)
+
+
+def test_user_cache_invalidated_during_load():
+    """Data loaded before a write that invalidated the user is not stored."""
+    cache = UserCache(ttl=60, max_size=2)
+
+    def load_then_write():
+        cache.invalidate([1])  # Another thread commits a change to user 1
+        return 'before the write'
+
+    assert cache.get(1, load_then_write) == 'before the write'
+    assert cache.get(1, lambda: 'after the write') == 'after the write'
+    assert cache.get(1, lambda: 'not loaded') == 'after the write'
+    assert not cache._loading and not cache._generations
+
+    with pytest.raises(ValueError):
+        cache.get(2, mock.MagicMock(side_effect=ValueError))
+    assert not cache._loading
@@ -0,0 +1,90 @@
+"""Tests for the WSGI entry-point, with a per-request overhead benchmark.
+
+Run with ``pytest -s`` to see the numbers.
+"""
+import os
+import importlib.util
+from pathlib import Path
+from timeit import timeit
+
+import pytest
+
+# wsgi.py is not part of the installed package
+_spec = importlib.util.spec_from_file_location(
+    'wsgi', Path(__file__).parent.parent / 'wsgi.py')
+wsgi = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(wsgi)
+
+REQUESTS = 10000
+
+
+def _environ(n):
+    environ = {f'HTTP_X_HEADER_{i}': 'value' for i in range(30)}
+    environ.update({'SERVER_NAME': 'some-container-id', 'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': f'/login/{n}', 'wsgi.url_scheme': 'http',
+                    'ADMIN_WEBAPP_TEST_KEY': 'from_environ'})
+    return environ
+
+
+def _copy_every_request(environ, start_response):
+    """The entry-point before config was loaded once."""
+    for key, value in environ.items():
+        if key == 'SERVER_NAME':
+            continue
+        os.environ[key] = str(value)
+    return wsgi.__flask_app__(environ, start_response)
+
+
+@pytest.fixture
+def fake_app(monkeypatch):
+    created = []
+    def create_web_app():
+        created.append(1)
+        return lambda environ, start_response: [b'OK']
+    monkeypatch.setattr(wsgi, 'create_web_app', create_web_app)
+    monkeypatch.setattr(wsgi, '__flask_app__', None)
+    yield created
+    for key in _environ(0):
+        os.environ.pop(key, None)
+
+
+def test_config_loaded_once(fake_app):
+    assert wsgi.application(_environ(0), None) == [b'OK']
+    assert os.environ['ADMIN_WEBAPP_TEST_KEY'] == 'from_environ'
+    assert os.environ.get('SERVER_NAME') != 'some-container-id'
+
+    assert wsgi.application(_environ(1), None) == [b'OK']
+    assert os.environ['PATH_INFO'] == '/login/0', "Later requests don't touch os.environ"
+    assert len(fake_app) == 1
+
+
+def test_config_allow_list(fake_app, monkeypatch):
+    monkeypatch.setattr(wsgi, 'WSGI_CONFIG_KEYS', ['ADMIN_WEBAPP_TEST_KEY'])
+    wsgi.application(_environ(0), None)
+    assert os.environ['ADMIN_WEBAPP_TEST_KEY'] == 'from_environ'
+    assert 'HTTP_X_HEADER_0' not in os.environ
+
+
+def test_per_request_overhead(fake_app):
+    environ = _environ(0)
+    wsgi.application(environ, None)
+    before = timeit(lambda: _copy_every_request(environ, None), number=REQUESTS)
+    after = timeit(lambda: wsgi.application(environ, None), number=REQUESTS)
+    print(f"\nWSGI entry-point overhead with {len(environ)} environ keys:"
+          f"\n  copy environ every request: {before / REQUESTS * 1e6:.2f}us"
+          f"\n  load config once:           {after / REQUESTS * 1e6:.2f}us")
+    assert after < before
+
+
+def test_render_pool_before_warm_up(monkeypatch):
+    """The render processes are forked before the app starts its threads."""
+    started = []
+    monkeypatch.setenv('WARM_UP', '1')
+    monkeypatch.setenv('CAPTCHA_RENDER_WORKERS', '1')
+    monkeypatch.setattr('admin_webapp.factory.create_web_app',
+                        lambda: started.append('app'))
+    monkeypatch.setattr('admin_webapp.stateless_captcha.init_render_pool',
+                        lambda *args: started.append('render pool'))
+    module = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(module)
+    assert started == ['render pool', 'app']
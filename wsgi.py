@@ -1,23 +1,91 @@
 """Web Server Gateway Interface entry-point."""
 
+from threading import Lock
+from flask import Config
+from admin_webapp import stateless_captcha
 from admin_webapp.factory import create_web_app
+from admin_webapp.extensions import dispose_after_fork
 import os
 
+try:
+    import uwsgi
+    from uwsgidecorators import postfork
+except ImportError:  # Not running in uwsgi
+    uwsgi = postfork = None
+
 __flask_app__ = None
+__flask_app_lock__ = Lock()
 
-def application(environ, start_response):    # type: ignore
-    """WSGI application."""
-    for key, value in environ.items():
+WSGI_CONFIG_KEYS = [key.strip() for key
+                    in os.environ.get('WSGI_CONFIG_KEYS', '').split(',')
+                    if key.strip()]
+"""Allow-list of request environ keys to copy to os.environ.
+
+If empty, every key is copied except ``SERVER_NAME``."""
+
+
+def load_environ_config(environ):    # type: ignore
+    """Copy config from the WSGI environ to os.environ.
+
+    This is done once, before the app is created, since config.py only reads
+    os.environ when the app is created.
+    """
+    keys = WSGI_CONFIG_KEYS or environ.keys()
+    for key in keys:
         # In some deployment scenarios (e.g. uWSGI on k8s), uWSGI will pass in
         # the hostname as part of the request environ. This will usually just
         # be a container ID, which is not helpful for things like building
         # URLs. We want to keep ``SERVER_NAME`` explicitly configured, either
         # in config.py or via an os.environ var loaded by config.py.
-        if key == 'SERVER_NAME':
+        if key == 'SERVER_NAME' or key not in environ:
             continue
-        os.environ[key] = str(value)
+        os.environ[key] = str(environ[key])
 
+
+def application(environ, start_response):    # type: ignore
+    """WSGI application."""
     global __flask_app__
     if __flask_app__ is None:
-        __flask_app__ = create_web_app()
+        with __flask_app_lock__:
+            if __flask_app__ is None:
+                load_environ_config(environ)
+                __flask_app__ = create_web_app()
     return __flask_app__(environ, start_response)
+
+
+def start_render_pool() -> None:
+    """Start the captcha render processes, if ``CAPTCHA_RENDER_WORKERS`` is set.
+
+    They are forked right away, so this runs while the worker has only one
+    thread, see :func:`admin_webapp.stateless_captcha.init_render_pool`.
+    """
+    config = Config(os.path.join(os.path.dirname(__file__), 'admin_webapp'))
+    config.from_pyfile('config.py')
+    if config['CAPTCHA_RENDER_WORKERS']:
+        stateless_captcha.init_render_pool(config['CAPTCHA_RENDER_WORKERS'],
+                                           config['CAPTCHA_RENDER_MAX_PENDING'],
+                                           config['CAPTCHA_RENDER_TIMEOUT'])
+
+
+if postfork is not None:
+    @postfork
+    def _after_fork() -> None:
+        """Don't share the master's DB connections if it built the app."""
+        if __flask_app__ is not None:
+            dispose_after_fork(__flask_app__)
+
+if uwsgi is not None and uwsgi.worker_id() == 0:
+    # Loaded by the master, each worker starts its processes after its fork
+    postfork(start_render_pool)
+else:
+    # Loaded by a worker (lazy-apps), which starts its request threads after
+    # this file is loaded, or not running in uwsgi
+    start_render_pool()
+
+if os.environ.get('WARM_UP', '0') == '1':
+    # Build and warm up the app as the worker loads this file (see lazy-apps
+    # in uwsgi.ini) instead of on its first request. Config then comes only
+    # from os.environ. This is after the render pool is forked, since the app
+    # starts threads (ex. the logout outbox) and opens DB and Redis
+    # connections.
+    __flask_app__ = create_web_app()